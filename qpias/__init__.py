@@ -6,12 +6,18 @@ Quantum Particle-in-a-Sandbox
 (c) Dhabih V. Chulhai, 2021
 '''
 from . import concepts
+from . import bank
 from . import buttons
+from . import cache
+from . import dynamics
 from . import game
+from . import grid
 from . import menu
 from . import particle
+from . import potentials
 from . import sandbox
 from . import stage
+from . import sweep
 from . import title
 from . import _version
 
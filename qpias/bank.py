@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Prebuilt solutions for the stages that come with the game.
+
+The bank is built with::
+
+    $ python3 -m qpias.bank
+
+which solves every potential in :py:func:`qpias.potentials.builtin_stages`
+and stores the solutions in ``qpias/data/solutions.npz``. A
+:py:class:`qpias.stage.Stage` looks up its solution there before solving
+the hamiltonian (see :py:func:`qpias.cache.get_default_cache`).
+"""
+
+import os
+import zipfile
+
+import numpy as np
+
+from qpias import potentials
+from qpias._version import __version__
+from qpias.particle import Particle
+
+# change this whenever the layout of the bank file changes
+_BANK_VERSION = 2
+
+BANK_FILE = os.path.join(os.path.dirname(__file__), 'data', 'solutions.npz')
+
+
+class SolutionBank():
+    """Read-only collection of solutions stored in a single ``.npz`` file,
+    keyed like :py:class:`qpias.cache.SolutionCache`.
+
+    Each solution is stored as one record (a structured array with a field
+    per array of the solution), so a lookup reads a single member of the
+    file. The file is opened once, when it is first used.
+
+    :param filename: The bank file, default :py:data:`BANK_FILE`
+    :type filename: str, optional
+    """
+
+    def __init__(self, filename=BANK_FILE):
+        """Initializes the :py:class:`SolutionBank` class."""
+
+        self.filename = filename
+        self._data = None
+        self._keys = None
+
+    @property
+    def keys(self):
+        """The keys of all solutions in the bank (empty if the bank file
+        is missing or was built with a different layout)."""
+
+        if self._keys is None:
+            self._keys = set()
+            try:
+                data = np.load(self.filename)
+                if int(data['__version__']) == _BANK_VERSION:
+                    self._data = data
+                    self._keys = set(name for name in data.files
+                                     if not name.startswith('__'))
+                else:
+                    data.close()
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+                pass
+        return self._keys
+
+    def get(self, key):
+        """Returns the solution stored under `key`, or None."""
+
+        if key not in self.keys: return None
+        record = self._data[key]
+        return {name: record[name] for name in record.dtype.names}
+
+
+def build_bank(filename=BANK_FILE):
+    """Solves all the stages that come with the game and stores their
+    solutions in `filename`.
+
+    :param filename: The bank file, default :py:data:`BANK_FILE`
+    :type filename: str, optional
+    """
+
+    arrays = {'__version__': np.array(_BANK_VERSION),
+              '__qpias_version__': np.array(__version__)}
+
+    for potential, length, emax in potentials.builtin_stages():
+
+        # use the same settings as qpias.stage.Stage
+        particle = Particle(potential=potential, length=length, emax=emax)
+        key = particle._solution_key()
+        particle.calculate_wave_functions()
+
+        # one record per solution, with a field per array
+        solution = {name: np.asarray(value) for name, value
+                    in particle.get_solution().items()}
+        record = np.zeros((), dtype=[(name, value.dtype, value.shape)
+                                     for name, value in solution.items()])
+        for name, value in solution.items():
+            record[name] = value
+        arrays[key] = record
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    np.savez_compressed(filename, **arrays)
+
+
+if __name__ == '__main__':
+    build_bank()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import collections
+import hashlib
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+# change this whenever the contents of a stored solution change
+_CACHE_VERSION = 1
+
+_default_cache = None
+
+
+def user_cache_dir():
+    """Returns the directory used to store QPiaS files between sessions
+    (e.g. ``~/.cache/qpias`` on Linux)."""
+
+    if sys.platform.startswith('win'):
+        base_path = os.environ.get('LOCALAPPDATA',
+            os.path.join(os.path.expanduser('~'), 'AppData', 'Local'))
+    elif sys.platform == 'darwin':
+        base_path = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    else:
+        base_path = os.environ.get('XDG_CACHE_HOME',
+            os.path.join(os.path.expanduser('~'), '.cache'))
+
+    return os.path.join(base_path, 'qpias')
+
+
+def get_default_cache():
+    """Returns the :py:class:`SolutionCache` shared by all game stages,
+    stored in :py:func:`user_cache_dir` and backed by the prebuilt
+    solutions of :py:mod:`qpias.bank`."""
+
+    from qpias.bank import SolutionBank
+
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SolutionCache(
+            directory=os.path.join(user_cache_dir(), 'solutions'),
+            bank=SolutionBank())
+    return _default_cache
+
+
+def solution_key(potential, **options):
+    """Returns a key identifying the solution of a hamiltonian, from a hash
+    of the contents of the `potential` array and all `options` that change
+    the solution (basis set size, length, mass, emax, ...).
+
+    :param potential: Potential surface
+    :type potential: numpy.ndarray
+
+    :return: Hexadecimal key
+    :type: str
+    """
+
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(potential, dtype=float).tobytes())
+    for name in sorted(options):
+        digest.update('{0}={1!r};'.format(name, options[name]).encode())
+    digest.update('version={0}'.format(_CACHE_VERSION).encode())
+    return digest.hexdigest()
+
+
+class SolutionCache():
+    """Two-tier store of solved hamiltonians (energies, coefficients and
+    operator matrices, see :py:func:`qpias.particle.Particle.get_solution`).
+
+    Recently used solutions are kept in memory. All solutions are also
+    written to `directory` as ``.npz`` files, so that they are available in
+    later sessions. The least recently used entries are removed when either
+    tier becomes too large. Solutions that are missing from memory are
+    looked up in the read-only `bank` before the disk.
+
+    :param directory: Where to store the solutions on disk, default None
+        (memory only)
+    :type directory: str, optional
+
+    :param max_memory_entries: Maximum number of solutions kept in memory,
+        default 32
+    :type max_memory_entries: int, optional
+
+    :param max_disk_bytes: Maximum total size of the solutions stored on
+        disk, default 64 MB
+    :type max_disk_bytes: int, optional
+
+    :param bank: Prebuilt solutions, default None
+    :type bank: qpias.bank.SolutionBank, optional
+
+    **Example**::
+
+        >>> cache = qpias.cache.SolutionCache(directory='/tmp/qpias')
+        >>> particle = qpias.Particle(potential=potential, cache=cache)
+        >>> particle.calculate_wave_functions() # solved and stored
+        >>> particle = qpias.Particle(potential=potential, cache=cache)
+        >>> particle.calculate_wave_functions() # loaded from memory
+    """
+
+    def __init__(self, directory=None, max_memory_entries=32,
+        max_disk_bytes=64*2**20, bank=None):
+        """Initializes the :py:class:`SolutionCache` class."""
+
+        self.bank = bank
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = collections.OrderedDict()
+
+    def get(self, key):
+        """Returns the solution stored under `key`, or None.
+
+        The arrays of a solution are shared and read-only."""
+
+        # memory tier
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        # prebuilt solutions
+        if self.bank is not None:
+            solution = self.bank.get(key)
+            if solution is not None:
+                self._store_in_memory(key, solution)
+                return solution
+
+        # disk tier
+        filename = self._filename(key)
+        if filename is None or not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as data:
+                solution = {name: data[name] for name in data.files}
+            os.utime(filename) # mark as recently used
+        except (OSError, ValueError, zipfile.BadZipFile):
+            self._remove(filename)
+            return None
+
+        self._store_in_memory(key, solution)
+        return solution
+
+    def put(self, key, solution):
+        """Stores a copy of a `solution` (dictionary of arrays) under `key`,
+        so the caller's arrays stay writeable."""
+
+        solution = {name: np.array(value, copy=True) for name, value
+                    in solution.items()}
+        self._store_in_memory(key, solution)
+
+        filename = self._filename(key)
+        if filename is None: return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = filename + '.tmp.npz'
+            np.savez_compressed(temporary, **solution)
+            os.replace(temporary, filename)
+        except OSError:
+            # the disk tier is optional (e.g. read-only home directory)
+            return
+        self._evict_from_disk()
+
+    def clear(self):
+        """Removes all solutions from memory and disk."""
+
+        self._memory.clear()
+        for filename in self._disk_files():
+            self._remove(filename)
+
+    def _store_in_memory(self, key, solution):
+        for value in solution.values():
+            value.flags.writeable = False
+        self._memory[key] = solution
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _filename(self, key):
+        if self.directory is None: return None
+        return os.path.join(self.directory, key + '.npz')
+
+    def _disk_files(self):
+        if self.directory is None or not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, filename) for filename
+                in os.listdir(self.directory) if filename.endswith('.npz')]
+
+    def _evict_from_disk(self):
+        """Removes the least recently used files until the disk tier is
+        within `max_disk_bytes`."""
+
+        files = []
+        for filename in self._disk_files():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+
+        total = sum(size for mtime, size, filename in files)
+        for mtime, size, filename in sorted(files):
+            if total <= self.max_disk_bytes: break
+            self._remove(filename)
+            total -= size
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
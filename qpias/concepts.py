@@ -1,8 +1,7 @@
-import numpy as np
-
 import pygame
 from pygame.locals import QUIT, VIDEORESIZE, KEYDOWN, MOUSEBUTTONUP
 
+from qpias import potentials
 from qpias.stage import Stage
 from qpias.menu import Menu
 
@@ -210,8 +209,7 @@ def lvl_schrodinger_cat(game):
                   ('X', 3,    ["You can always return to the ground state by "
                                "pressing [G]."])]
 
-        potential = np.zeros((1001))
-        potential[400:601] = 50000
+        potential = potentials.schrodinger_cat_potential()
 
         stage = Stage(game, potential, initial_conditions={'n': 1}, 
             goal=goal, level_options=level_options, events=events)
@@ -266,9 +264,7 @@ def lvl_uncertainty_principle(game):
                   ('X', 2,    ["The certainty in the position leads to uncertainty in "
                                "the momentum --- this is the uncertainty principle."])]
 
-        potential = np.zeros((1001)) + 500
-        potential[200:301] = 600
-        potential[600:701] = 0
+        potential = potentials.uncertainty_potential()
 
         stage = Stage(game, potential, initial_conditions={'n': 1}, 
             goal=goal, level_options=level_options, events=events)
@@ -301,8 +297,7 @@ def lvl_tunneling(game):
                   ('G', 15, ["I think your particle has the momentum this time, "
                              "I can feel it!"])]
 
-        potential = np.zeros((501))
-        potential[230:281] = 800 
+        potential = potentials.tunneling_potential(800)
 
         stage = Stage(game, potential, initial_conditions={'n': 9},
                       goal=goal, level_options=level_options, events=events)
@@ -323,8 +318,7 @@ def lvl_tunneling(game):
                   ('G', 15, ["I think your particle has the momentum this time, "
                              "I can feel it!"])]
 
-        potential = np.zeros((501))
-        potential[230:281] = 1800
+        potential = potentials.tunneling_potential(1800)
         stage = Stage(game, potential,
                       initial_conditions={'n': 9}, goal=goal,
                       level_options=level_options, events=events)
@@ -420,7 +414,7 @@ def lvl_momentum_tutorial(game):
                            "However, you can only increase your energy by "
                            "collapsing your momentum with [P]!"])]
 
-    potential = np.abs(0.5 - np.linspace(0,1,1001)) * 5000
+    potential = potentials.momentum_tutorial_potential()
     stage = Stage(game, potential, initial_conditions={'n': 1},
         goal=goal, level_options=level_options, events=events)
     completed = stage.run()
@@ -459,11 +453,7 @@ def lvl_climb_the_stairs(game):
 
     events = [('TIME', 0, ["Can a quantum particle climb stairs?"])]
 
-    potential = np.zeros((1001))
-    potential[200:400] = 1000
-    potential[400:600] = 2000
-    potential[600:800] = 3000
-    potential[800:]    = 4000
+    potential = potentials.stairs_potential()
 
     stage = Stage(game, potential, initial_conditions={'n': 1},
         goal=goal, level_options=level_options, events=events)
@@ -484,8 +474,7 @@ def lvl_down_the_well(game):
                            "the potential is low because you just have too "
                            "much energy and no way to loose it!"])]
 
-    potential = np.zeros((1001)) + 4000
-    potential[450:551] = 0
+    potential = potentials.well_potential()
 
     stage = Stage(game, potential, initial_conditions={'n': 5},
         goal=goal, level_options=level_options, events=events)
@@ -506,8 +495,7 @@ def lvl_cliff(game):
                            "the potential is low because you just have too "
                            "much energy and no way to loose it!"])]
 
-    potential = np.zeros((1001))
-    potential[:200] = 5000
+    potential = potentials.cliff_potential()
 
     stage = Stage(game, potential, initial_conditions={'n': 27},
         goal=goal, level_options=level_options, events=events)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from scipy import fft, linalg
+
+
+class EigenPropagator():
+    r"""Propagates the wave function of a particle in time, in the basis of
+    its energy eigenfunctions.
+
+    Each energy eigenfunction only changes by a phase, so a time step is
+
+    .. math::
+
+        c_n(t + \Delta t) = c_n(t) e^{-i E_n \Delta t}
+
+    The phase factors are calculated once and reused for every step with the
+    same :math:`\Delta t`, so a step costs one complex multiplication per
+    coefficient. Round-off errors in the norm of the wave function are
+    removed every `renormalize_every` steps.
+
+    :param particle: A particle with solved energy eigenfunctions
+    :type particle: qpias.particle.Particle
+
+    :param C: Coefficients of the wave function at time zero, default None
+        (:attr:`Particle.C`)
+    :type C: numpy.ndarray, optional
+
+    :param renormalize_every: Number of steps between renormalizations,
+        default 600
+    :type renormalize_every: int, optional
+
+    :var numpy.ndarray Ct: Coefficients of the wave function at the current
+        time.
+
+    :var float time: The current time.
+
+    **Example**::
+
+        >>> propagator = qpias.dynamics.EigenPropagator(particle)
+        >>> for frame in range(100):
+        ...     psi = propagator.step(game.dt)
+    """
+
+    def __init__(self, particle, C=None, renormalize_every=600):
+        """Initializes the :py:class:`EigenPropagator` class."""
+
+        self.particle = particle
+        self.renormalize_every = renormalize_every
+        self.reset(C)
+
+    def reset(self, C=None, time=0):
+        """Restarts the propagation (e.g. after a collapse of the wave
+        function) from the coefficients `C` at time `time`."""
+
+        if C is None: C = self.particle.C
+        C = np.array(C, dtype=complex)
+        self.Ct = C * np.exp(-1j * self.particle.energies * time)
+        self.time = time
+        self._norm = np.sqrt((C.conjugate() * C).real.sum())
+        self._dt = None
+        self._steps = 0
+
+    def step(self, dt):
+        """Advances the wave function by a time step `dt`.
+
+        Also sets :attr:`Particle.Ct` and :attr:`Particle.time`.
+
+        :return: The wave function in position basis.
+        :type: numpy.ndarray
+        """
+
+        # the phase factors only change when the time step does
+        if dt != self._dt:
+            self._phase = np.exp(-1j * self.particle.energies * dt)
+            self._dt = dt
+
+        self.Ct *= self._phase
+        self.time += dt
+
+        # remove drift in the norm of the wave function
+        self._steps += 1
+        if self._steps % self.renormalize_every == 0:
+            norm = np.sqrt((self.Ct.conjugate() * self.Ct).real.sum())
+            self.Ct *= self._norm / norm
+
+        self.particle.Ct = self.Ct
+        self.particle.time = self.time
+        return self.wave_function()
+
+    def wave_function(self):
+        """Returns the wave function in position basis at the current time.
+        """
+        return np.dot(self.Ct, self.particle.wave_functions)
+
+
+class MidpointPropagator():
+    r"""Propagates the wave function of a particle in time under a
+    time-dependent potential :math:`V(x,t)` (e.g. a moving barrier or a
+    laser pulse), in the particle-in-a-box basis set of the particle.
+
+    A time step uses the exponential midpoint rule, with the hamiltonian at
+    the middle of the step,
+
+    .. math::
+
+        b(t + \Delta t) = e^{-i H(t + \Delta t/2) \Delta t} b(t)
+
+    where the exponential is evaluated from the eigenvalues and eigenvectors
+    of :math:`H(t + \Delta t/2)`. The step conserves the norm of the wave
+    function and is exact for a static potential at any :math:`\Delta t`,
+    so only the change of the potential within a step causes errors. The
+    hamiltonian is only diagonalized again when the potential changes (once
+    per step for a potential that changes every frame), and the phase
+    factors when :math:`\Delta t` does.
+
+    :param particle: A particle with solved energy eigenfunctions
+    :type particle: qpias.particle.Particle
+
+    :param potential: Function of time that returns the potential on the
+        grid of the particle (:attr:`Particle.x`), default None (the static
+        potential of the particle)
+    :type potential: callable, optional
+
+    :param C: Coefficients of the wave function (in the energy eigenfunction
+        basis) at time zero, default None (:attr:`Particle.C`)
+    :type C: numpy.ndarray, optional
+
+    :var numpy.ndarray b: Coefficients of the wave function in the basis set
+        at the current time.
+
+    :var numpy.ndarray Ct: Coefficients of the wave function at the current
+        time, projected onto the energy eigenfunctions of the particle.
+
+    :var numpy.ndarray potential: The potential at the middle of the last
+        step.
+
+    :var float time: The current time.
+
+    **Example**::
+
+        >>> def moving_barrier(t):
+        ...     return 2000 * (np.abs(particle.x - 0.5 - 10*t) < 0.05)
+        >>> propagator = qpias.dynamics.MidpointPropagator(particle,
+        ...     moving_barrier)
+        >>> for frame in range(100):
+        ...     psi = propagator.step(game.dt)
+    """
+
+    def __init__(self, particle, potential=None, C=None):
+        """Initializes the :py:class:`MidpointPropagator` class."""
+
+        self.particle = particle
+        self._potential_function = potential
+        self._kinetic = particle._kinetic_energies(0, particle.basis_size)
+        self.potential = None
+        self.reset(C)
+
+    def reset(self, C=None, time=0):
+        """Restarts the propagation (e.g. after a collapse of the wave
+        function) from the coefficients `C` (in the energy eigenfunction
+        basis) at time `time`."""
+
+        if C is None: C = self.particle.C
+        C = np.array(C, dtype=complex)
+        self.b = np.dot(self.particle._coefficients, C)
+        self.Ct = C
+        self.time = time
+        self._dt = None
+
+    def _hamiltonian(self, time):
+        """Returns the hamiltonian in the basis set at `time`, or None if it
+        has not changed since the last call."""
+
+        if self._potential_function is None:
+            potential = self.particle.potential
+        else:
+            potential = np.asarray(self._potential_function(time),
+                dtype=float)
+
+        if self.potential is not None and np.array_equal(potential,
+            self.potential):
+            return None
+
+        self.potential = potential
+        V = self.particle._potential_matrix_columns(potential, 0,
+            len(self._kinetic))
+        self.H = np.diag(self._kinetic) + V
+        return self.H
+
+    def step(self, dt):
+        """Advances the wave function by a time step `dt`.
+
+        Also sets :attr:`Particle.Ct` and :attr:`Particle.time`.
+
+        :return: The wave function in position basis.
+        :type: numpy.ndarray
+        """
+
+        # diagonalize again only if the hamiltonian changed, and update the
+        # phase factors only if it or the time step changed
+        H = self._hamiltonian(self.time + dt/2)
+        if H is not None:
+            self._energies, self._vectors = linalg.eigh(H)
+            self._dt = None
+        if dt != self._dt:
+            self._phase = np.exp(-1j * self._energies * dt)
+            self._dt = dt
+
+        self.b = np.dot(self._vectors,
+            self._phase * np.dot(self._vectors.T, self.b))
+        self.time += dt
+
+        self.Ct = np.dot(self.particle._coefficients.T, self.b)
+        self.particle.Ct = self.Ct
+        self.particle.time = self.time
+        return self.wave_function()
+
+    def energy(self):
+        """Returns the average energy of the wave function for the
+        hamiltonian of the last step."""
+        return np.dot(self.b.conjugate(), np.dot(self.H, self.b)).real
+
+    def wave_function(self):
+        """Returns the wave function in position basis at the current time.
+        """
+        return np.dot(self.b, self.particle.basis)
+
+
+class SplitOperatorPropagator():
+    r"""Propagates the wave function of a particle in time directly on the
+    grid of the particle (:attr:`Particle.x`), which suits large grids and
+    wave packets with high momenta that are poorly described by a few
+    energy eigenfunctions.
+
+    A time step is the symmetric split of the kinetic and potential energy,
+
+    .. math::
+
+        \Psi(t + \Delta t) = e^{-i V \Delta t / 2} \,
+        \mathcal{S}^{-1} e^{-i k^2 \Delta t / 2m} \mathcal{S} \,
+        e^{-i V \Delta t / 2} \Psi(t)
+
+    where :math:`\mathcal{S}` is the (orthonormal) discrete sine transform
+    of the interior grid points, so the wave function stays zero at the
+    walls of the box. The phase factors are calculated once and reused for
+    every step with the same :math:`\Delta t`, and the wave function is
+    updated in place.
+
+    :param particle: A particle with solved energy eigenfunctions
+    :type particle: qpias.particle.Particle
+
+    :param C: Coefficients of the wave function (in the energy eigenfunction
+        basis) at time zero, default None (:attr:`Particle.C`)
+    :type C: numpy.ndarray, optional
+
+    :var numpy.ndarray psi: The wave function on the grid at the current
+        time.
+
+    :var numpy.ndarray Ct: Coefficients of the wave function at the current
+        time, projected onto the energy eigenfunctions of the particle.
+
+    :var float time: The current time.
+    """
+
+    def __init__(self, particle, C=None):
+        """Initializes the :py:class:`SplitOperatorPropagator` class."""
+
+        self.particle = particle
+        npoints = particle.xpoints - 2
+        self._k2 = (np.arange(1, npoints+1) * np.pi / particle.length)**2
+        self._potential = np.asarray(particle.potential, dtype=float)[1:-1]
+        # projects the wave function on the grid onto the energy
+        # eigenfunctions
+        self._projector = particle.wave_functions * particle._weights
+        self.psi = np.zeros((particle.xpoints), dtype=complex)
+        self.reset(C)
+
+    def reset(self, C=None, time=0):
+        """Restarts the propagation (e.g. after a collapse of the wave
+        function) from the coefficients `C` (in the energy eigenfunction
+        basis) at time `time`."""
+
+        if C is None: C = self.particle.C
+        C = np.array(C, dtype=complex)
+        self.psi[:] = np.dot(C * np.exp(-1j * self.particle.energies * time),
+            self.particle.wave_functions)
+        self.psi[0] = self.psi[-1] = 0
+        self.Ct = C
+        self.time = time
+        self._dt = None
+
+    def step(self, dt):
+        """Advances the wave function by a time step `dt`.
+
+        Also sets :attr:`Particle.Ct` and :attr:`Particle.time`.
+
+        :return: The wave function in position basis.
+        :type: numpy.ndarray
+        """
+
+        # the phase factors only change when the time step does
+        if dt != self._dt:
+            self._kinetic_phase = np.exp(-0.5j * self._k2 * dt
+                / self.particle.mass)
+            self._potential_phase = np.exp(-0.5j * self._potential * dt)
+            self._dt = dt
+
+        interior = self.psi[1:-1]
+        interior *= self._potential_phase
+        spectrum = fft.dst(interior, type=1, norm='ortho')
+        spectrum *= self._kinetic_phase
+        interior[:] = fft.dst(spectrum, type=1, norm='ortho',
+            overwrite_x=True)
+        interior *= self._potential_phase
+        self.time += dt
+
+        # project onto the energy eigenfunctions for the expectation values
+        self.Ct = np.dot(self._projector, self.psi)
+        self.particle.Ct = self.Ct
+        self.particle.time = self.time
+        return self.psi
+
+    def wave_function(self):
+        """Returns the wave function in position basis at the current time.
+        """
+        return self.psi
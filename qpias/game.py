@@ -12,6 +12,8 @@ import matplotlib.backends.backend_agg as agg
 import numpy as np
 import scipy as sp
 
+from qpias import potentials
+
 class Game():
     """Creates the game window and stores all the information about the game state.
 
@@ -38,6 +40,10 @@ class Game():
         the current wave function, default False (current wave function)
     :type eigenvectors_mode: bool, optional
 
+    :param carpet_mode: Whether to display the probability density as a
+        scrolling space-time image (a "quantum carpet"), default False
+    :type carpet_mode: bool, optional
+
     **Example**::
 
         >>> import qpias
@@ -59,6 +65,7 @@ class Game():
         self.top_bar_font_size = 25
         self.superposition_mode = False
         self.eigenvectors_mode = False
+        self.carpet_mode = False
 
         # initialize pygame
         self.pygame = pygame.init()
@@ -105,6 +112,9 @@ class Game():
         self.__properties_time = 0
         self.__properties_duration = 10 # recalculate every n frames
 
+        # number of time steps shown in the space-time image
+        self._carpet_rows = 200
+
         # how long a wave function collapse takes
         self._collapse_time = 0.75 # in seconds?
 
@@ -135,9 +145,11 @@ class Game():
     @property
     def _all_level_options(self):
         """All the shortcut options available for each level."""
-        return ['ESC', 'LEFT', 'RIGHT', 'UP', 'DOWN', 'X', 'P', 'G', 'S', 'E'].copy()
+        return ['ESC', 'LEFT', 'RIGHT', 'UP', 'DOWN', 'X', 'P', 'G', 'S', 'E',
+                'C'].copy()
 
-    def plot_wave_function(self, particle, psi, average_energy=None):
+    def plot_wave_function(self, particle, psi, average_energy=None,
+        potential=None):
         """Plots the wave function to the screen.
 
         :param particle: The particle and potential surface to use
@@ -148,11 +160,16 @@ class Game():
 
         :param average_energy: The current average energy of the particle
         :type average_energy: float
+
+        :param potential: The current potential surface, if it changes in
+            time (default: the potential surface of the particle)
+        :type potential: numpy.ndarray
         """
 
         # some defaults
         ax = self.ax
-        potential = particle.potential
+        if potential is None:
+            potential = particle.potential
         energies = particle.energies
         canvas = self.canvas
         x = particle.x
@@ -207,7 +224,11 @@ class Game():
         # prints the expectation values and uncertainties
         self.draw_top_bar(particle, psi, average_energy)
 
-        if self.eigenvectors_mode:
+        if self.carpet_mode:
+
+            self.plot_carpet(particle, ymin, ymax, space=space, scale=scale)
+
+        elif self.eigenvectors_mode:
 
             self.plot_eigenvectors(particle, ymax, space=space, scale=scale)
 
@@ -224,7 +245,7 @@ class Game():
                 label='$\\mathrm{Re}[\\Psi]$')
 
         # plot the probability density function
-        if not self.eigenvectors_mode:
+        if not self.eigenvectors_mode and not self.carpet_mode:
             psi_squared = (psi*psi.conjugate()).real
             ax.fill_between(x+space, yshift+psi_squared,
                 yshift-psi_squared, color='tab:blue', lw=self.lw*4, alpha=0.8)
@@ -270,6 +291,26 @@ class Game():
             ax.plot(x+space, wf.real+energy, color='tab:red', lw=lw)
 
 
+    def plot_carpet(self, particle, ymin, ymax, space, scale):
+        """Plots the probability density of the last time steps as a
+        space-time image, with the current time at the top."""
+
+        ax = self.ax
+        x = particle.x
+
+        # times of the last rows relative to the current coefficients
+        times = (np.arange(self._carpet_rows) - self._carpet_rows + 1) * self.dt
+        carpet = particle.get_space_time(times, C=particle.Ct,
+            probability=True, single_precision=True)
+
+        xlim, ylim = ax.get_xlim(), ax.get_ylim()
+        ax.imshow(carpet, aspect='auto', origin='lower', cmap='magma',
+            extent=(x[0]+space, x[-1]+space, ymin, ymax), zorder=2)
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+        ax.plot(x+space, scale(particle.potential), color='w',
+            lw=self.lw*2, zorder=3)
+
     def plot_eigenvectors(self, particle, ymax, space, scale):
 
         ax = self.ax
@@ -370,6 +411,17 @@ class Game():
         text_surf = self.top_bar_font.render(text, True, (0,0,0))
         self.screen.blit(text_surf, (self.top_bar_x, self.top_bar_locations[5]))
 
+        # print the probability of collapsing into the goal region
+        if self._goal is not None and 'position' in self._goal:
+            overlaps = particle.interval_overlaps(*self._goal['position'])
+            probability = np.dot(coefficient.conjugate(),
+                np.dot(overlaps, coefficient)).real
+            text = ('Goal Probability     =    {0:>5.1f}'.format(
+                probability * 100) + ' %')
+            text_surf = self.top_bar_font.render(text, True, (0,0,0))
+            self.screen.blit(text_surf,
+                (self.top_bar_x, self.top_bar_locations[6]))
+
 
     def collapse_animation(self, particle, C_old, C_new):
     
@@ -453,7 +505,7 @@ class Game():
         self.plot_origin = (0, self.height * 0.3)
 
         # top bar localtions
-        self.top_bar_locations = (np.arange(6) + 0.5) * self.height * 0.3 / 7
+        self.top_bar_locations = (np.arange(7) + 0.5) * self.height * 0.3 / 7
         self.top_bar_x = self.width * 0.05
 
         # reset figure size and linewidth
@@ -619,6 +671,7 @@ class Game():
         self.time = 0
         self.superposition_mode = False
         self.eigenvectors_mode = False
+        self.carpet_mode = False
 
 
     def quit(self, *args, **kwargs):
@@ -629,25 +682,19 @@ class Game():
     # some common potentials used
     @property
     def harmonic_oscillator_potential(self):
-        return ((np.linspace(0,1,500)-0.5))**2 * 40000.0
+        return potentials.harmonic_oscillator_potential()
 
     @property
-    def morse_potential(self, re=0.12, de=2000):
-        x = np.linspace(0,1,500)
-        return de * (1 - np.exp(-8 * (x - re)))**2
+    def morse_potential(self):
+        return potentials.morse_potential()
 
     @property
-    def barrier_potential(self, x0=0.46, x1=0.56, de=1200):
-        x = np.linspace(0,1,500)
-        potential = np.zeros_like(x)
-        potential[np.where((x>=x0)&(x<=x1))] = de
-        return potential
+    def barrier_potential(self):
+        return potentials.barrier_potential()
 
     @property
     def coulombic_potential(self):
-        potential = -1/np.abs(np.linspace(0,1,100)-0.5001)
-        potential += 1000
-        return potential
+        return potentials.coulombic_potential()
 
     @property
     def get_background_color(self):
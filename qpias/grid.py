@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from scipy import linalg, sparse
+from scipy.sparse import linalg as splinalg
+
+from qpias.particle import Particle
+
+
+class GridParticle(Particle):
+    r"""A particle whose hamiltonian is discretized with finite differences
+    on the grid of the potential (:attr:`Particle.x`), instead of being
+    expanded in the particle-in-a-box basis set.
+
+    The kinetic energy of the interior grid points (the wave function is
+    zero at the walls) is
+
+    .. math::
+
+        -\frac{1}{2m}\frac{d^2\psi}{dx^2} \approx -\frac{1}{2m h^2}
+        \left(\psi_{k-1} - 2\psi_k + \psi_{k+1}\right)
+
+    with ``order=2``, so the hamiltonian is tridiagonal and is solved with
+    :py:func:`scipy.linalg.eigh_tridiagonal`. With ``order=4`` the five
+    point stencil is used and the (pentadiagonal) hamiltonian is solved with
+    shift-invert Lanczos iterations (:py:func:`scipy.sparse.linalg.eigsh`),
+    which only need a banded factorization. Only the energy eigenfunctions
+    below the energy cutoff are calculated, and the cost grows linearly with
+    the number of grid points, so potentials with :math:`10^5` grid points
+    and sharp features are solved in seconds (about one second with
+    ``order=2``).
+
+    :param length: Length of the box in which particle lives, default 1
+    :type length: float, optional
+
+    :param mass: Mass of the particle, default 1
+    :type mass: float, optional
+
+    :param potential: Potential surface for the particle, default None
+        (particle-in-a-box)
+    :type potential: numpy.ndarray, optional
+
+    :param emax: The maximum energy eigenvectors to use to describe wave
+        functions, default None
+    :type emax: float
+
+    :param order: Order of the finite difference stencil, either 2 or 4,
+        default 2
+    :type order: int, optional
+
+    :param seed: Seed of the random numbers used to collapse the wave
+        function, default None (unpredictable)
+    :type seed: int, optional
+
+    **Example**::
+
+        >>> x = np.linspace(0, 1, 100001)
+        >>> particle = qpias.grid.GridParticle(potential=4000*(x > 0.7))
+        >>> particle.calculate_wave_functions()
+    """
+
+    def __init__(self, length=1, mass=1, potential=None, emax=None, order=2,
+        seed=None):
+        """Initializes the :py:class:`GridParticle` class."""
+
+        super().__init__(length=length, mass=mass, potential=potential,
+            emax=emax, seed=seed)
+
+        if order not in (2, 4):
+            raise Exception('Unknown finite difference order "{0}"!'.format(
+                order))
+        self.order = order
+
+    @property
+    def dpsi_dx(self):
+        """First derivative of the energy eigenfunctions (finite
+        differences, calculated when first used)."""
+        if self._dpsi_dx is None and self.wave_functions is not None:
+            self._dpsi_dx = np.gradient(self.wave_functions, self.x, axis=1)
+        return self._dpsi_dx
+
+    @property
+    def d2psi_dx2(self):
+        """Second derivative of the energy eigenfunctions (finite
+        differences, calculated when first used)."""
+        if self._d2psi_dx2 is None and self.wave_functions is not None:
+            self._d2psi_dx2 = np.gradient(self.dpsi_dx, self.x, axis=1)
+        return self._d2psi_dx2
+
+    def calculate_wave_functions(self, potential=None):
+        """Calculates the wave functions (eigenvectors) and energies
+        (eigenvalues) of the finite difference hamiltonian.
+
+        :param potential: Potential to use (on the same grid), default None
+        :type potential: numpy.ndarray, optional
+
+        Stores results in :attr:`Particle.wave_functions`,
+        :attr:`Particle.energies`, and :attr:`Particle.average_energy`.
+        As for :py:class:`qpias.particle.Particle`, only the energy
+        eigenfunctions with energies up to :math:`1.2 E_\\text{max}` are
+        kept, and :math:`E_\\text{max}` is the 19th lowest energy if `emax`
+        was not given.
+        """
+
+        if potential is None: potential = self.potential
+        potential = np.asarray(potential, dtype=float)
+        if len(potential) != self.xpoints:
+            raise Exception('The potential must have {0} points!'.format(
+                self.xpoints))
+
+        h = self.x[1] - self.x[0]
+        npoints = self.xpoints - 2
+        kinetic = 1 / (2 * self.mass * h**2)
+        diagonal = potential[1:-1].copy()
+
+        # below all energies
+        lowest = min(potential.min(), 0) - 1
+
+        if self.order == 2:
+            diagonal += 2 * kinetic
+            off_diagonal = np.full((npoints-1), -kinetic)
+            energies, vectors = self._lowest_tridiagonal(diagonal,
+                off_diagonal, lowest)
+        else:
+            # the wave function is odd about the walls (psi_{-1} = -psi_1)
+            diagonal += 30 * kinetic / 12
+            diagonal[[0,-1]] -= kinetic / 12
+            H = sparse.diags([np.full((npoints-2), kinetic / 12),
+                              np.full((npoints-1), -16 * kinetic / 12),
+                              diagonal,
+                              np.full((npoints-1), -16 * kinetic / 12),
+                              np.full((npoints-2), kinetic / 12)],
+                             [-2, -1, 0, 1, 2], format='csc')
+            energies, vectors = self._lowest_banded(H, lowest)
+
+        self._reset_wave_functions()
+        self.nmax = len(energies)
+        self.energies = energies
+
+        # normalize the eigenvectors on the grid
+        self.wave_functions = np.zeros((self.nmax, self.xpoints))
+        self.wave_functions[:,1:-1] = vectors.T / np.sqrt(h)
+
+        # momenta of the plane waves used to collapse the momentum
+        momenta = np.arange(-self.nmax,self.nmax+1) * np.pi / self.length
+        self.momenta = np.delete(momenta, self.nmax)
+
+        self.get_operator_matrices()
+
+        # set the initial wave function as the lowest energy eigenfunction
+        self.C = np.zeros((self.nmax), dtype=complex)
+        self.C[0] = 1
+        self.average_energy = self.energies[0]
+
+    def _lowest_tridiagonal(self, diagonal, off_diagonal, lowest):
+        """Returns the energies and eigenvectors (as columns) of a
+        tridiagonal hamiltonian between `lowest` (below all energies) and
+        the energy cutoff. Sets :attr:`Particle._emax` if it was not
+        given."""
+
+        nlowest = min(19, len(diagonal))
+        if self._emax is None:
+            energies, vectors = linalg.eigh_tridiagonal(diagonal,
+                off_diagonal, select='i', select_range=(0, nlowest-1))
+            self._emax = energies[-1]
+        else:
+            energies = np.zeros((0))
+            vectors = np.zeros((len(diagonal), 0))
+
+        # count the states below the cutoff (eigenvalues only), and get the
+        # missing ones by index, so that no state is found twice
+        nstates = 0
+        if self._emax*1.2 > lowest:
+            nstates = len(linalg.eigvalsh_tridiagonal(diagonal, off_diagonal,
+                select='v', select_range=(lowest, self._emax*1.2)))
+        if nstates > len(energies):
+            more_energies, more_vectors = linalg.eigh_tridiagonal(diagonal,
+                off_diagonal, select='i',
+                select_range=(len(energies), nstates-1))
+            energies = np.append(energies, more_energies)
+            vectors = np.append(vectors, more_vectors, axis=1)
+
+        nkeep = np.searchsorted(energies, self._emax*1.2, side='right')
+        return energies[:nkeep], vectors[:,:nkeep]
+
+    def _lowest_banded(self, H, lowest):
+        """Returns the energies and eigenvectors (as columns) of a sparse
+        banded hamiltonian below the energy cutoff, found with shift-invert
+        Lanczos iterations around `lowest` (below all energies). Sets
+        :attr:`Particle._emax` if it was not given."""
+
+        npoints = H.shape[0]
+        nlowest = min(19, npoints - 1)
+        k = nlowest
+        while True:
+            energies, vectors = splinalg.eigsh(H, k=k, sigma=lowest,
+                which='LM')
+            order = np.argsort(energies)
+            energies, vectors = energies[order], vectors[:,order]
+            if self._emax is None: self._emax = energies[nlowest-1]
+            if energies[-1] > self._emax*1.2 or k >= npoints - 1: break
+            k = min(2 * k, npoints - 1)
+
+        nkeep = np.searchsorted(energies, self._emax*1.2, side='right')
+        return energies[:nkeep], vectors[:,:nkeep]
+
+    def get_operator_matrices(self, C=None):
+        r"""Calculates the operator matrices :math:`<\hat{x}>`,
+        :math:`<\hat{x}^2>`, :math:`<\hat{p}>`, and :math:`<\hat{p}^2>`
+        of the energy eigenfunctions by quadrature on the grid."""
+
+        weighted = self.wave_functions * self._weights
+        self._xmat = np.dot(weighted * self.x, self.wave_functions.T)
+        self._x2mat = np.dot(weighted * self.x**2, self.wave_functions.T)
+        self._pmat = -1j * np.dot(weighted, self.dpsi_dx.T)
+        self._p2mat = np.dot(self.dpsi_dx * self._weights,
+            self.dpsi_dx.T).astype(complex)
+
+    def interval_overlaps(self, a, b):
+        r"""Returns the overlaps of the energy eigenfunctions over the
+        interval :math:`[a, b]` by quadrature on the grid (see
+        :py:func:`qpias.particle.Particle.interval_overlaps`)."""
+
+        if (a, b) not in self._interval_overlaps:
+            weights = self._weights * ((self.x >= a) & (self.x <= b))
+            self._interval_overlaps[(a, b)] = np.dot(
+                self.wave_functions * weights, self.wave_functions.T)
+        return self._interval_overlaps[(a, b)]
@@ -155,7 +155,8 @@ def about_menu(game):
                  "[P] - Collapse to a momentum.\n"
                  "[G] - Collapse to the ground-state.\n"
                  "[S] - Show wave function as a superposition.\n"
-                 "[E] - Show all energy eigenfunctions.\n")
+                 "[E] - Show all energy eigenfunctions.\n"
+                 "[C] - Show the probability density over time.\n")
 
     modes_text = ("CORE CONCEPTS - achieve certain goals by collapsing "
                   "your particle's energy (using [UP] or [DOWN]) to match the "
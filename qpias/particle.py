@@ -1,9 +1,298 @@
 #!/usr/bin/env python3
 
+import collections
+import functools
+import threading
+import warnings
+
 import numpy as np
 from numpy import linalg
 import scipy as sp
-from scipy import linalg, integrate
+from scipy import linalg, fft
+from scipy.sparse import linalg as splinalg
+
+from qpias.cache import solution_key
+
+
+def _simpson_weights(x):
+    """Returns the Simpson's rule quadrature weights for the evenly spaced
+    grid `x`, such that ``(weights * y).sum()`` approximates the integral
+    of `y` over `x`.
+
+    For an even number of points, the average of the two possible
+    Simpson/trapezoid combinations is used (the old ``even='avg'`` rule of
+    ``scipy.integrate.simps``, which is not the default of
+    :py:func:`scipy.integrate.simpson` since SciPy 1.11).
+    """
+
+    npoints = len(x)
+    h = x[1] - x[0]
+
+    def simpson(n):
+        w = np.zeros((n))
+        w[1:-1:2] = 4
+        w[2:-1:2] = 2
+        w[0] = w[-1] = 1
+        return w * h / 3
+
+    if npoints < 3:
+        return np.zeros((npoints)) + h / 2
+    if npoints % 2 == 1:
+        return simpson(npoints)
+
+    # simpson's rule on the first N-1 points and trapezoid on the last
+    # interval, averaged with the reverse
+    weights = np.zeros((npoints))
+    weights[:-1] += simpson(npoints-1)
+    weights[-2:] += h / 2
+    weights[1:] += simpson(npoints-1)
+    weights[:2] += h / 2
+    return weights / 2
+
+
+# maximum total size of the basis function arrays kept by _sine_basis
+_SINE_BASIS_CACHE_BYTES = 256 * 2**20
+
+# maximum size of the weighted basis functions of the potentials that
+# solve_batch assembles at once
+_BATCH_CHUNK_BYTES = 64 * 2**20
+
+_sine_basis_cache = collections.OrderedDict()
+_sine_basis_lock = threading.Lock()
+
+
+def _sine_basis(nmax, length, xpoints, derivative=0):
+    r"""Returns the particle-in-a-box basis functions (or their first or
+    second derivatives) evaluated on `xpoints` evenly spaced points
+    between 0 and `length`, as an `nmax` x `xpoints` array.
+
+    The arrays are cached and shared between all particles, so they are
+    read-only. The least recently used arrays are dropped once the cache
+    holds more than :py:data:`_SINE_BASIS_CACHE_BYTES` (the newest array is
+    always kept). A smaller basis set on the same grid is returned as the
+    first rows of a cached larger one.
+
+    .. math::
+
+        \chi_n(x) = \sqrt{\frac{2}{L}} \sin\left( \frac{n\pi x}{L} \right)
+        \:\:\:
+        \frac{d\chi_n}{dx} = \frac{n\pi}{L} \sqrt{\frac{2}{L}}
+        \cos\left( \frac{n\pi x}{L} \right)
+        \:\:\:
+        \frac{d^2\chi_n}{dx^2} = -\frac{n^2\pi^2}{L^2} \chi_n(x)
+
+    """
+
+    key = (length, xpoints, derivative)
+    with _sine_basis_lock:
+        for (size, *cached_key), basis in _sine_basis_cache.items():
+            if cached_key == list(key) and size >= nmax:
+                _sine_basis_cache.move_to_end((size,) + key)
+                return basis[:nmax]
+
+    basis = _calculate_sine_basis(nmax, length, xpoints, derivative)
+
+    with _sine_basis_lock:
+        # the smaller basis sets on this grid are part of the new one
+        for size, *cached_key in list(_sine_basis_cache):
+            if cached_key == list(key) and size < nmax:
+                del _sine_basis_cache[(size,) + key]
+        _sine_basis_cache[(nmax,) + key] = basis
+        total = sum(cached.nbytes for cached in _sine_basis_cache.values())
+        while total > _SINE_BASIS_CACHE_BYTES and len(_sine_basis_cache) > 1:
+            total -= _sine_basis_cache.popitem(last=False)[1].nbytes
+    return basis
+
+
+def _calculate_sine_basis(nmax, length, xpoints, derivative):
+    """Calculates the (read-only) array returned by :py:func:`_sine_basis`.
+    """
+
+    n = np.arange(1, nmax+1)[:,None]
+    x = np.linspace(0, length, xpoints)
+    theta = n * np.pi * x / length
+
+    if derivative == 0:
+        basis = np.sqrt(2/length) * np.sin(theta)
+    elif derivative == 1:
+        basis = (n * np.pi / length) * np.sqrt(2/length) * np.cos(theta)
+    elif derivative == 2:
+        basis = ( (-1 * n**2 * np.pi**2 / length**2) * np.sqrt(2/length)
+                * np.sin(theta) )
+    else:
+        raise Exception('Only up to second derivatives are available!')
+
+    basis.flags.writeable = False
+    return basis
+
+
+@functools.lru_cache(maxsize=16)
+def _basis_operator_matrices(nmax, length):
+    r"""Returns the :math:`<\hat{x}>`, :math:`<\hat{x}^2>`,
+    :math:`<\hat{p}>`, and :math:`<\hat{p}^2>` matrices in the
+    particle-in-a-box basis set of size `nmax` for a box of length `length`.
+
+    The matrices are cached (for the most recently used sizes and lengths)
+    and are read-only.
+
+    .. math::
+
+        <\hat{x}>_{nm} = \begin{cases} \frac{L}{2} & \text{if } n = m \\
+        \frac{2L}{\pi^2}\left(\frac{1}{(n+m)^2} - \frac{1}{(n-m)^2}\right)
+        & \text{if } n+m \text{ is odd} \\
+        0 & \text{otherwise} \end{cases}
+
+        <\hat{x}^2>_{nm} = \begin{cases}
+        \frac{L^2 (2\pi^2 n^2 - 3)}{6 \pi^2 n^2} & \text{if } n = m \\
+        \frac{2L^2(-1)^{n+m}}{\pi^2}\left(\frac{1}{(n-m)^2} -
+        \frac{1}{(n+m)^2}\right) & \text{otherwise} \end{cases}
+
+        <\hat{p}>_{nm} = \begin{cases} \frac{4inm}{L(m^2-n^2)}
+        & \text{if } n+m \text{ is odd} \\
+        0 & \text{otherwise} \end{cases}
+
+        <\hat{p}^2>_{nm} = \begin{cases} \frac{n^2\pi^2}{L^2}
+        & \text{if } n = m \\
+        0 & \text{otherwise} \end{cases}
+
+    """
+
+    n = np.arange(1, nmax+1)[:,None]
+    m = n.T
+    diagonal = np.arange(nmax)
+    odd = (n + m) % 2 == 1
+
+    # (n - m)**2 and m**2 - n**2, with ones where they would be zero
+    diff2 = np.where(n == m, 1, (n - m)**2)
+    sum2 = (n + m)**2
+    msq_nsq = np.where(n == m, 1, m**2 - n**2)
+
+    xmat = np.where(odd, (2 * length / np.pi**2) * (1/sum2 - 1/diff2), 0.0)
+    xmat[diagonal,diagonal] = length / 2
+
+    x2mat = ( (2 * length**2 / np.pi**2) * (-1.0)**(n + m)
+            * (1/diff2 - 1/sum2) )
+    x2mat[diagonal,diagonal] = ( length**2 * ((2 * np.pi**2 * n[:,0]**2) - 3)
+                               / (6 * np.pi**2 * n[:,0]**2) )
+
+    pmat = np.where(odd, 4j * n * m / (length * msq_nsq), 0)
+
+    p2mat = np.diag(n[:,0]**2 * np.pi**2 / length**2).astype(complex)
+
+    for mat in (xmat, x2mat, pmat, p2mat):
+        mat.flags.writeable = False
+    return xmat, x2mat, pmat, p2mat
+
+
+@functools.lru_cache(maxsize=16)
+def _basis_interval_overlaps(nmax, length, a, b):
+    r"""Returns the overlap matrix of the particle-in-a-box basis set of size
+    `nmax` (box of length `length`) over the interval :math:`[a, b]`.
+
+    The matrices are cached (for the most recently used intervals) and are
+    read-only.
+
+    .. math::
+
+        S_{nm} = \int_a^b \chi_n(x) \chi_m(x) dx = \frac{1}{L} \left(
+        I_{n-m} - I_{n+m} \right) \:\:\: \text{with} \:\:\:
+        I_k = \int_a^b \cos\left( \frac{k\pi x}{L} \right) dx
+
+    """
+
+    a = min(max(a, 0), length)
+    b = min(max(b, a), length)
+
+    n = np.arange(1, nmax+1)[:,None]
+    m = n.T
+
+    def cosine_integral(k):
+        k_safe = np.where(k == 0, 1, k)
+        integral = ( length / (k_safe * np.pi) * (np.sin(k_safe*np.pi*b/length)
+                   - np.sin(k_safe*np.pi*a/length)) )
+        return np.where(k == 0, b - a, integral)
+
+    overlaps = (cosine_integral(n - m) - cosine_integral(n + m)) / length
+    overlaps.flags.writeable = False
+    return overlaps
+
+
+def solve_batch(potentials, nmax=40, length=1, mass=1,
+    potential_method='quadrature', nstates=None, operators=False):
+    r"""Solves the hamiltonians of a stack of potentials that share the same
+    grid and basis set.
+
+    All potential energy matrices are assembled at once and diagonalized
+    together, and the basis functions and operator matrices are shared by
+    all potentials, which is much faster than solving one
+    :py:class:`Particle` per potential.
+
+    :param potentials: Stack of potentials, one per row (K x xpoints)
+    :type potentials: numpy.ndarray
+
+    :param nmax: Size of the basis set, default 40
+    :type nmax: int, optional
+
+    :param length: Length of the box, default 1
+    :type length: float, optional
+
+    :param mass: Mass of the particle, default 1
+    :type mass: float, optional
+
+    :param potential_method: How to evaluate the potential energy matrices,
+        default ``'quadrature'``. See :py:class:`Particle`.
+    :type potential_method: str, optional
+
+    :param nstates: Number of (lowest) energy eigenfunctions to return,
+        default None (all)
+    :type nstates: int, optional
+
+    :param operators: Whether to also return the :math:`<\hat{x}>`,
+        :math:`<\hat{x}^2>`, :math:`<\hat{p}>`, and :math:`<\hat{p}^2>`
+        matrices in the energy eigenfunction basis, default False
+    :type operators: bool, optional
+
+    :returns: Tuple of the energies (K x nstates), the coefficients of the
+        energy eigenfunctions as columns (K x nmax x nstates), and, if
+        requested, a dictionary of the stacked operator matrices
+        (K x nstates x nstates) with keys ``'x'``, ``'x2'``, ``'p'`` and
+        ``'p2'``.
+
+    **Example**::
+
+        >>> heights = np.linspace(0, 2000, 50)
+        >>> potentials = np.array([qpias.potentials.tunneling_potential(h)
+        ...                        for h in heights])
+        >>> energies, coefficients = qpias.particle.solve_batch(potentials)
+    """
+
+    potentials = np.asarray(potentials, dtype=float)
+    particle = Particle(nmax=nmax, length=length, mass=mass,
+        potential=potentials[0], potential_method=potential_method)
+
+    # assemble the hamiltonians in chunks of potentials, so that the weighted
+    # basis functions of a chunk stay within _BATCH_CHUNK_BYTES, and
+    # diagonalize them all together
+    chunk = max(1, _BATCH_CHUNK_BYTES // (8 * nmax * potentials.shape[-1]))
+    H = np.empty((len(potentials), nmax, nmax))
+    for start in range(0, len(potentials), chunk):
+        H[start:start+chunk] = particle._potential_matrix_columns(
+            potentials[start:start+chunk], 0, nmax)
+    diagonal = np.arange(nmax)
+    H[:,diagonal,diagonal] += particle._kinetic_energies(0, nmax)
+    energies, coefficients = np.linalg.eigh(H)
+    energies = energies[:,:nstates]
+    coefficients = coefficients[:,:,:nstates]
+
+    if not operators:
+        return energies, coefficients
+
+    names = ('x', 'x2', 'p', 'p2')
+    coefficients_T = np.swapaxes(coefficients, 1, 2)
+    matrices = {name: np.matmul(coefficients_T, np.matmul(mat, coefficients))
+                for name, mat
+                in zip(names, _basis_operator_matrices(nmax, length))}
+    return energies, coefficients, matrices
 
 
 class Particle():
@@ -26,9 +315,67 @@ class Particle():
         functions, default None
     :type emax: float
 
+    :param potential_method: How to evaluate the potential energy matrix,
+        either ``'quadrature'`` (Simpson's rule on the basis functions) or
+        ``'dct'`` (a single cosine transform of the potential), default
+        ``'quadrature'``. See :py:func:`generate_potential_matrix`.
+    :type potential_method: str, optional
+
+    :param solver: How to diagonalize the hamiltonian, either ``'full'``
+        (all eigenvalues and eigenvectors), ``'subset'`` (only the
+        eigenvalues and eigenvectors below the energy cutoff) or
+        ``'sparse'`` (iteratively, without forming the hamiltonian matrix),
+        default ``'full'``. See :py:func:`calculate_wave_functions`.
+    :type solver: str, optional
+
+    :param cache: Where to look up and store the solutions of the
+        hamiltonian, default None (always solve).
+        See :py:class:`qpias.cache.SolutionCache`.
+    :type cache: qpias.cache.SolutionCache, optional
+
+    :param adaptive: Whether to grow the basis set (starting from `nmax`)
+        until the kept energies are converged, default False.
+        See :py:func:`converge_basis`.
+    :type adaptive: bool, optional
+
+    :param tolerance: Relative convergence tolerance of the kept energies,
+        both for an adaptive basis set and for the iterations of
+        ``solver='sparse'``, default 1e-6
+    :type tolerance: float, optional
+
+    :param nmax_block: Number of basis functions added in each growth step
+        of an adaptive basis set, default 10
+    :type nmax_block: int, optional
+
+    :param nmax_limit: Largest basis set allowed for an adaptive basis set,
+        default 400
+    :type nmax_limit: int, optional
+
+    :param seed: Seed of the random numbers used to collapse the wave
+        function, default None (unpredictable)
+    :type seed: int, optional
+
+    :param parity_tolerance: Relative tolerance to which a potential must be
+        symmetric about :math:`L/2` for the basis functions with odd and
+        even :math:`n` to be solved separately, default 1e-10 (None to never
+        separate them). See :py:func:`_diagonalize_parity`.
+    :type parity_tolerance: float, optional
+
+    :var numpy.random.Generator rng: Random number generator used to collapse
+        the wave function and to sample measurements.
+
     :var numpy.ndarray x: Coordinates to use for wave function.
 
-    :var numpy.ndarray basis: Basis functions in position space.
+    :var int basis_size: Number of basis functions used to build the
+        hamiltonian (:attr:`Particle.nmax` becomes the number of energy
+        eigenfunctions kept after :py:func:`calculate_wave_functions`).
+
+    :var float truncation_error: Estimated error of the kept energies due to
+        the finite basis set (largest change of the kept energies in the last
+        growth step of an adaptive basis set), or None.
+
+    :var numpy.ndarray basis: Basis functions in position space. This is a
+        read-only array shared between particles.
         See :py:func:`generate_basis_functions`.
 
     :var numpy.ndarray momenta: Basis functions in momentum space.
@@ -40,14 +387,36 @@ class Particle():
 
     """
 
-    def __init__(self, nmax=40, length=1, mass=1, potential=None, emax=None):
+    def __init__(self, nmax=40, length=1, mass=1, potential=None, emax=None,
+        potential_method='quadrature', solver='full', cache=None,
+        adaptive=False, tolerance=1e-6, nmax_block=10, nmax_limit=400,
+        seed=None, parity_tolerance=1e-10):
         """Initializes the :py:class:`Particle` class."""
 
         self.nmax = nmax
+        self.basis_size = nmax
         self.length = length
         self.mass = mass
         self._emax = emax
 
+        if potential_method not in ('quadrature', 'dct'):
+            raise Exception('Unknown potential method "{0}"!'.format(
+                potential_method))
+        self.potential_method = potential_method
+
+        if solver not in ('full', 'subset', 'sparse'):
+            raise Exception('Unknown solver "{0}"!'.format(solver))
+        self.solver = solver
+        self.cache = cache
+
+        self.adaptive = adaptive
+        self.tolerance = tolerance
+        self.nmax_block = nmax_block
+        self.nmax_limit = nmax_limit
+        self.truncation_error = None
+        self.rng = np.random.default_rng(seed)
+        self.parity_tolerance = parity_tolerance
+
         # if no potential given, set potential to zero
         if potential is not None:
             self.potential = potential
@@ -55,19 +424,131 @@ class Particle():
             self.potential = np.zeros((500))
 
         self.x = np.linspace(0, self.length, self.xpoints)
+        self._weights = _simpson_weights(self.x)
 
         # set some defaults
         self.basis = None
         self.momenta = None
+        self.wave_functions = None
         self.V = None
         self.H = None
         self.average_energy = None
+        self._coefficients = None
+        self._dpsi_dx = None
+        self._d2psi_dx2 = None
+        self._plane_waves = None
+        self._momentum_overlaps = None
+        self._projector = None
+        self._interval_overlaps = {}
 
     @property
     def xpoints(self):
         """Number of points along the potential surface."""
         return len(self.potential)
 
+    @property
+    def dpsi_dx(self):
+        r"""First derivative :math:`d\psi/dx` of the energy eigenfunctions.
+        Calculated when first used after :py:func:`calculate_wave_functions`.
+        """
+        if self._dpsi_dx is None and self._coefficients is not None:
+            d1_basis = _sine_basis(self.basis_size, self.length,
+                self.xpoints, 1)
+            self._dpsi_dx = np.dot(self._coefficients.T, d1_basis)
+        return self._dpsi_dx
+
+    @property
+    def d2psi_dx2(self):
+        r"""Second derivative :math:`d^2\psi/dx^2` of the energy
+        eigenfunctions. Calculated when first used after
+        :py:func:`calculate_wave_functions`.
+        """
+        if self._d2psi_dx2 is None and self._coefficients is not None:
+            d2_basis = _sine_basis(self.basis_size, self.length,
+                self.xpoints, 2)
+            self._d2psi_dx2 = np.dot(self._coefficients.T, d2_basis)
+        return self._d2psi_dx2
+
+    def _reset_wave_functions(self):
+        """Forgets the wave functions derived from a previous hamiltonian."""
+        self._coefficients = None
+        self._dpsi_dx = None
+        self._d2psi_dx2 = None
+        self._momentum_overlaps = None
+        self._projector = None
+        self._interval_overlaps = {}
+
+    @property
+    def momentum_overlaps(self):
+        r"""Fourier overlaps of the energy eigenfunctions with the momentum
+        plane waves of :attr:`Particle.momenta`, one row per momentum and
+        one column per eigenfunction:
+
+        .. math::
+
+            \frac{1}{\sqrt{2\pi}} \int_0^L \psi_n(x) e^{i k x} dx
+
+        Calculated once per solution, so that the momentum amplitudes of a
+        wave function are a single product with its coefficients."""
+        if self._momentum_overlaps is None and self.wave_functions is not None:
+            self._momentum_overlaps = np.dot(self._get_plane_waves(),
+                self.wave_functions.T)
+        return self._momentum_overlaps
+
+    def interval_overlaps(self, a, b):
+        r"""Returns the overlaps of the energy eigenfunctions over the
+        interval :math:`[a, b]`,
+
+        .. math::
+
+            S_{ij} = \int_a^b \psi_i(x) \psi_j(x) dx
+
+        so that the probability of finding the particle in the interval is
+        :math:`\text{Re}(C^\dagger S C)`. The matrices are calculated
+        exactly from the basis set (see :py:func:`_basis_interval_overlaps`)
+        and stored for each interval until the next solution.
+        """
+
+        if (a, b) not in self._interval_overlaps:
+            C = self._coefficients
+            overlaps = _basis_interval_overlaps(len(C), self.length,
+                float(a), float(b))
+            self._interval_overlaps[(a, b)] = np.dot(C.T, np.dot(overlaps, C))
+        return self._interval_overlaps[(a, b)]
+
+    def _get_plane_waves(self):
+        """Returns the momentum plane waves on the grid, multiplied by the
+        quadrature weights (one row per momentum)."""
+        if (self._plane_waves is None
+            or len(self._plane_waves) != len(self.momenta)):
+            self._plane_waves = (np.exp(1j * np.outer(self.momenta, self.x))
+                * self._weights / np.sqrt(2*np.pi))
+        return self._plane_waves
+
+    def _get_projector(self):
+        """Returns the pseudo-inverse of the energy eigenfunctions on the
+        grid, which gives the least-squares coefficients of any wave
+        function in position basis. Calculated once per solution."""
+        if self._projector is None:
+            self._projector = sp.linalg.pinv(self.wave_functions.T)
+        return self._projector
+
+    def momentum_distribution(self, C=None):
+        """Returns the probability of each momentum in
+        :attr:`Particle.momenta` for a wave function.
+
+        :param numpy.ndarray C: Coefficients of the wave function in
+            eigenfunctions basis. Default `None` (:attr:`Particle.Ct`, or
+            :attr:`Particle.C` before the wave function has been evolved).
+
+        :return: Tuple of the momenta and their (normalized) probabilities.
+        """
+
+        if C is None: C = getattr(self, 'Ct', self.C)
+        psi_p = np.dot(self.momentum_overlaps, C)
+        prob = (psi_p*psi_p.conjugate()).real
+        return self.momenta, prob / prob.sum()
+
     def generate_basis_functions(self):
         r"""Creates a basis set based on the solutions to the
         one-dimensional particle-in-a-box without a potential.
@@ -90,12 +571,9 @@ class Particle():
             \:\:\: k=\pm 1,\pm 2,\cdots,\pm n_\text{max}
 
         """
-        basis = np.zeros((self.nmax, len(self.x)))
-        for i in range(self.nmax):
-            basis[i] = ( np.sqrt(2/self.length)
-                     * np.sin((i+1)*np.pi*self.x/self.length) )
-        self.basis = basis
-        
+        self.basis = _sine_basis(self.basis_size, self.length, self.xpoints)
+
+
         # calculate momenta basis functions
         momenta = np.arange(-self.nmax,self.nmax+1) * np.pi / self.length
         momenta = np.delete(momenta, int(len(momenta)/2))
@@ -123,12 +601,8 @@ class Particle():
             0 & \text{if } n \neq m\end{cases}
 
         """
-        H = np.zeros((self.nmax, self.nmax))
-
         # Create kinetic energy matrix
-        for i in range(self.nmax):
-            n = i+1
-            H[i,i] += n**2 * np.pi**2 / (2 * self.mass * self.length**2)
+        H = np.diag(self._kinetic_energies(0, self.basis_size))
 
         # Create potential energy matrix
         self.generate_potential_matrix(potential)
@@ -136,6 +610,13 @@ class Particle():
         # add potential energy to hamiltonian
         H += self.V
         self.H = H
+        self._reset_wave_functions()
+
+    def _kinetic_energies(self, start, stop):
+        """Returns the diagonal kinetic energy matrix elements of the basis
+        functions `start` to `stop` (counting from zero)."""
+        n = np.arange(start+1, stop+1)
+        return n**2 * np.pi**2 / (2 * self.mass * self.length**2)
 
     def generate_potential_matrix(self, potential=None):
         r"""Creates the potential energy matrix elements. Stores the
@@ -148,6 +629,31 @@ class Particle():
 
             \mathbf{V}_{nm} = \int_0^L \chi_n^*(x) V(x) \chi_m(x) dx
 
+        With the default ``'quadrature'`` method, the integrals are
+        evaluated with Simpson's rule, using the quadrature weights
+        :math:`w_k` of the :attr:`Particle.x` grid:
+
+        .. math::
+
+            \mathbf{V}_{nm} = \sum_k \chi_n(x_k) w_k V(x_k) \chi_m(x_k)
+
+        With the ``'dct'`` method, the product of two sine functions is
+        written as a difference of cosines, so that
+
+        .. math::
+
+            \mathbf{V}_{nm} = c_{|n-m|} - c_{n+m}, \:\:\:
+            c_k = \frac{1}{L} \int_0^L V(x)
+            \cos\left( \frac{k\pi x}{L} \right) dx
+
+        i.e. a Toeplitz minus a Hankel matrix. All :math:`c_k` are found
+        from one type-I discrete cosine transform of the potential
+        (trapezoid rule on the :attr:`Particle.x` grid).
+
+        If the potential is symmetric about :math:`L/2`, the elements
+        between basis functions with odd and even :math:`n` vanish, and only
+        the two blocks of the same parity are calculated.
+
         """
         # set potential to zero if none given
         if potential is None: potential = self.potential
@@ -155,17 +661,71 @@ class Particle():
             potential = np.zeros((self.xpoints))
             self.potential = potential
 
-        # calculate the potential energy matrix
-        V = np.zeros((self.nmax, self.nmax))
-        for i in range(self.nmax):
-            ni = i+1 
-            for j in range(i, self.nmax):
-                nj = j+1
-                V[i,j] = ((2/self.length) * sp.integrate.simps(np.sin(
-                          ni*np.pi*self.x/self.length)
-                       * np.sin(nj*np.pi*self.x/self.length) * potential, self.x)) 
-                V[j,i] = V[i,j]
-        self.V = V
+        if (self.potential_method == 'quadrature' and self.basis_size > 1
+            and self._is_symmetric(potential)):
+            basis = _sine_basis(self.basis_size, self.length, self.xpoints)
+            weighted = self._weights * potential
+            self.V = np.zeros((self.basis_size, self.basis_size))
+            for parity in (0, 1):
+                block = basis[parity::2]
+                self.V[parity::2,parity::2] = np.dot(block * weighted,
+                    block.T)
+            return
+
+        self.V = self._potential_matrix_columns(potential, 0, self.basis_size)
+
+    def _is_symmetric(self, potential):
+        """Whether `potential` is symmetric about :math:`L/2` to within
+        :attr:`Particle.parity_tolerance`."""
+        if self.parity_tolerance is None: return False
+        potential = np.asarray(potential)
+        return ( np.abs(potential - potential[::-1]).max()
+                 <= self.parity_tolerance * np.abs(potential).max() )
+
+    def _potential_matrix_columns(self, potential, start, stop, basis=None):
+        """Returns the columns `start` to `stop` (counting from zero) of the
+        potential energy matrix of the first `stop` basis functions. See
+        :meth:`generate_potential_matrix`.
+
+        `potential` may also be a stack of potentials (one per row), in which
+        case a stack of matrices is returned. `basis` is the sine basis on
+        the grid (with at least `stop` functions) if it was already
+        evaluated."""
+
+        if self.potential_method == 'dct':
+
+            npoints = potential.shape[-1]
+
+            # cosine moments c_k = (1/L) int V(x) cos(k pi x / L) dx for
+            # k = 0,...,N-1 (the 1/L cancels the grid spacing L/(N-1))
+            moments = ( sp.fft.dct(potential, type=1, axis=-1)
+                      / (2 * (npoints - 1)) )
+
+            # on this grid, the moments are even and periodic in k with
+            # period 2(N-1), which gives all k = 0,...,2 stop
+            k = np.arange(2*stop+1) % (2 * (npoints - 1))
+            k = np.minimum(k, 2 * (npoints - 1) - k)
+            moments = moments[...,k]
+
+            # V = Toeplitz(c_{|n-m|}) - Hankel(c_{n+m})
+            n = np.arange(1, stop+1)[:,None]
+            m = np.arange(start+1, stop+1)[None,:]
+            return moments[...,np.abs(n - m)] - moments[...,n + m]
+
+        # calculate the potential energy matrix as a single weighted product
+        # of the sine basis evaluated on the grid
+        if basis is None: basis = _sine_basis(stop, self.length, self.xpoints)
+        basis = basis[:stop]
+        weighted = (self._weights * potential)[...,None,:]
+        return np.matmul(basis * weighted, basis[start:].T)
+
+    def _quadrature_weights(self):
+        """Returns the quadrature weights of the grid that are equivalent to
+        the potential method: Simpson's rule for ``'quadrature'`` and the
+        trapezoid rule for ``'dct'``."""
+        if self.potential_method == 'dct':
+            return np.full((self.xpoints), self.x[1] - self.x[0])
+        return self._weights
 
     def calculate_wave_functions(self, H=None, potential=None):
         """Calculates the wave functions (eigenvectors) and energies (eigenvalues)
@@ -178,130 +738,425 @@ class Particle():
         :type potential: numpy.ndarray, optional
 
         Stores results in :attr:`Particle.wave_functions`, 
-        :attr:`Particle.dpsi_dx`, :attr:`Particle.d2psi_dx2`,
         :attr:`Particle.energies`, and :attr:`Particle.average_energy`.
+        The derivatives :attr:`Particle.dpsi_dx` and
+        :attr:`Particle.d2psi_dx2` are only calculated when first used.
+
+        Only the energy eigenfunctions with energies up to
+        :math:`1.2 E_\text{max}` are kept. If `emax` was not given,
+        :math:`E_\text{max}` is the 19th lowest energy. With
+        ``solver='subset'``, LAPACK is only asked for the eigenvalues and
+        eigenvectors below this cutoff (using the MRRR driver), which is
+        much cheaper than a full diagonalization for large basis sets.
+        With ``solver='sparse'`` (and no `H` given), the hamiltonian is
+        never formed; see :py:func:`_diagonalize_sparse`.
+
+        With ``adaptive=True`` (and no `H` given), the basis set is grown
+        with :py:func:`converge_basis` first.
+
+        A constant (or zero) potential is solved analytically, see
+        :py:func:`_solve_constant`.
 
         """
         # can only specify one of the hamiltonian or potential
         if H is not None and potential is not None:
             raise Exception('Cannot specify both "H" and "potential"!')
-        elif potential is not None:
-            self.generate_hamiltonian(potential=potential)
-            H = self.H
-        elif H is None:
-            if self.H is None: self.generate_hamiltonian(potential=potential)
-            H = self.H
 
-        # diagonalize the hamiltonian
-        energies, coefficients = np.linalg.eigh(H)
-        if self._emax is None: self._emax = energies[18]
-        idx = np.where(energies > self._emax*1.2)
-        try:
-            self.nmax = idx[0][0]
-        except IndexError:
-            self.nmax = len(energies)
-        self.energies = energies[:self.nmax]
-        coefficients = coefficients[:self.nmax,:self.nmax]
-
-        # normalize the coefficients
-        for i in range(self.nmax):
-            integral = (coefficients[:,i]*coefficients[:,i]).sum()
-            coefficients[:,i] /= np.sqrt(integral)
+        # the particle-in-a-box, possibly shifted by a constant
+        if H is None:
+            constant = self.potential if potential is None else potential
+            if constant is not None and np.min(constant) == np.max(constant):
+                energies, coefficients = self._solve_constant(constant)
+                self._set_solution({'energies': energies,
+                                    'coefficients': coefficients})
+                return
+
+        # use a stored solution if available
+        key = None
+        if H is None and self.cache is not None:
+            key = self._solution_key(potential)
+            solution = self.cache.get(key)
+            if solution is not None:
+                self._set_solution(solution)
+                return
+
+        if H is None and self.adaptive:
+            energies, coefficients = self.converge_basis(potential=potential)
+            H = self.H
+        elif H is None and self.solver == 'sparse':
+            energies, coefficients = self._diagonalize_sparse(potential)
+        else:
+            if potential is not None:
+                self.generate_hamiltonian(potential=potential)
+                H = self.H
+            elif H is None:
+                if self.H is None: self.generate_hamiltonian()
+                H = self.H
+
+            # diagonalize the hamiltonian
+            energies, coefficients = self._diagonalize(H)
+
+        self._set_solution({'energies': energies,
+                            'coefficients': coefficients})
+        if key is not None:
+            self.cache.put(key, self.get_solution())
+
+    def get_solution(self):
+        """Returns the solution of the hamiltonian as a dictionary of arrays:
+        the kept energies, their coefficients in the basis set, the energy
+        cutoff, the estimated truncation error and the operator matrices in
+        the energy eigenfunction basis.
+        See :py:class:`qpias.cache.SolutionCache`.
+        """
+        truncation_error = self.truncation_error
+        if truncation_error is None: truncation_error = np.nan
+        return {'energies': self.energies,
+                'coefficients': self._coefficients,
+                'emax': self._emax,
+                'truncation_error': truncation_error,
+                'xmat': self._xmat,
+                'x2mat': self._x2mat,
+                'pmat': self._pmat,
+                'p2mat': self._p2mat}
+
+    def _set_solution(self, solution):
+        """Sets up the particle from the kept energies and coefficients
+        of a solution (see :py:func:`get_solution`). The operator matrices
+        are calculated if they are not part of the solution."""
+
+        energies = solution['energies']
+        coefficients = solution['coefficients']
+        if 'emax' in solution:
+            self._emax = float(solution['emax'])
+        if 'truncation_error' in solution:
+            self.truncation_error = float(solution['truncation_error'])
+            if np.isnan(self.truncation_error): self.truncation_error = None
+
+        # d psi / dx and d^2 psi / dx^2 are calculated when needed
+        self._reset_wave_functions()
+        self._coefficients = coefficients
+        self.basis_size = len(coefficients)
+        self.nmax = len(energies)
+        self.energies = energies
 
         # generate the wave functions from the basis set
-        if self.basis is None:
-            self.generate_basis_functions()
+        self.generate_basis_functions()
         self.wave_functions = np.dot(coefficients.T, self.basis)
 
         # operator matrices
-        self.get_operator_matrices(coefficients)
+        if 'xmat' in solution:
+            self._xmat = solution['xmat']
+            self._x2mat = solution['x2mat']
+            self._pmat = solution['pmat']
+            self._p2mat = solution['p2mat']
+        else:
+            self.get_operator_matrices(coefficients)
 
         # set the initial wave function as the lowest energy eigenfunction
         self.C = np.zeros((len(self.energies)), dtype=complex)
         self.C[0] = 1
 
-        # calculate wave function property: d \psi / dx
-        d1_basis = np.zeros((self.nmax, len(self.x)))
-        for i in range(self.nmax):
-            n = i + 1
-            d1_basis[i] = ( (n * np.pi / self.length)
-                    * np.sqrt(2/self.length)
-                    * np.cos( n * np.pi * self.x / self.length) )
-        self.dpsi_dx = np.dot(coefficients.T, d1_basis)
-
-        # calculate the wave function property: d^2 \psi / dx^2
-        d2_basis = np.zeros((self.nmax, len(self.x)))
-        for i in range(self.nmax):
-            n = i + 1
-            d2_basis[i] = ( (-1 * n**2 * np.pi**2 / self.length**2)
-                    * np.sqrt(2/self.length)
-                    * np.sin( n * np.pi * self.x / self.length) )
-        self.d2psi_dx2 = np.dot(coefficients.T, d2_basis)
-
         # calculate and set the particle (average) energy
         self.average_energy = self.energies[0]
 
+    def _solution_key(self, potential=None):
+        """Returns the key of the solution for `potential` with the current
+        settings. See :py:func:`qpias.cache.solution_key`."""
+
+        if potential is None: potential = self.potential
+        options = {'nmax': self.basis_size,
+                   'length': float(self.length),
+                   'mass': float(self.mass),
+                   'emax': None if self._emax is None else float(self._emax),
+                   'potential_method': self.potential_method,
+                   'solver': self.solver,
+                   'adaptive': self.adaptive}
+        if self.adaptive or self.solver == 'sparse':
+            options['tolerance'] = self.tolerance
+        if self.adaptive:
+            options.update({'nmax_block': self.nmax_block,
+                            'nmax_limit': self.nmax_limit})
+        return solution_key(potential, **options)
+
+    def converge_basis(self, potential=None):
+        """Grows the basis set, starting from :attr:`Particle.basis_size`
+        functions, in blocks of `nmax_block` functions until the kept
+        energies change by less than `tolerance` (relative to the largest
+        kept energy), or until `nmax_limit` basis functions are used. The
+        basis set never grows beyond ``xpoints - 2`` functions, since the
+        grid cannot resolve more, and a warning is given if the energies
+        are not converged at the limit. If the basis set starts at the
+        limit, it cannot grow, and :attr:`Particle.truncation_error` stays
+        None.
+
+        Each growth step only calculates the new rows and columns of the
+        hamiltonian. Stores the final hamiltonian and potential energy
+        matrices in :attr:`Particle.H` and :attr:`Particle.V`, the final size
+        of the basis set in :attr:`Particle.basis_size` and the last change
+        in the kept energies in :attr:`Particle.truncation_error`.
+
+        :param potential: Potential to use, default None
+        :type potential: numpy.ndarray, optional
+
+        :returns: Tuple of the kept energies and their coefficients (as
+            columns) in the final basis set.
+        """
+
+        if potential is None: potential = self.potential
+        emax = self._emax
+        size = self.basis_size
+        limit = min(self.nmax_limit, self.xpoints - 2)
+
+        # evaluate the basis functions on the grid once, up to the limit
+        basis = None
+        if self.potential_method == 'quadrature':
+            basis = _sine_basis(max(size, limit), self.length, self.xpoints)
+
+        V = self._potential_matrix_columns(potential, 0, size, basis)
+        T = self._kinetic_energies(0, size)
+        energies, coefficients = self._diagonalize(np.diag(T) + V)
+        self.truncation_error = None
+
+        while size < limit:
+
+            # add the new rows and columns to the matrices
+            new_size = min(size + self.nmax_block, limit)
+            columns = self._potential_matrix_columns(potential, size, new_size,
+                basis)
+            V_new = np.empty((new_size, new_size))
+            V_new[:size,:size] = V
+            V_new[:,size:] = columns
+            V_new[size:,:size] = columns[:size].T
+            V = V_new
+            T = np.append(T, self._kinetic_energies(size, new_size))
+            size = new_size
+
+            # compare the energies kept in both basis sets (the cutoff is
+            # re-estimated if it wasn't given)
+            self._emax = emax
+            new_energies, coefficients = self._diagonalize(np.diag(T) + V)
+            nkeep = min(len(energies), len(new_energies))
+            self.truncation_error = np.abs(new_energies[:nkeep]
+                                         - energies[:nkeep]).max()
+            energies = new_energies
+            if (self.truncation_error
+                <= self.tolerance * np.abs(energies[:nkeep]).max()): break
+        else:
+            # only if the basis set could grow at all
+            if self.truncation_error is not None:
+                warnings.warn('The energies are not converged to within the '
+                    'tolerance with {0} basis functions!'.format(size))
+
+        self.basis_size = size
+        self.V = V
+        self.H = np.diag(T) + V
+        self._reset_wave_functions()
+        return energies, coefficients
+
+    def _solve_constant(self, potential):
+        r"""Returns the energies and coefficients (as columns) of the energy
+        eigenfunctions within the energy cutoff for a constant `potential`
+        :math:`V_0`, without any quadrature or diagonalization: the energy
+        eigenfunctions are the basis functions, with energies
+
+        .. math::
+
+            E_n = \frac{n^2 \pi^2}{2 m L^2} + V_0
+
+        Sets :attr:`Particle._emax` if it was not given.
+        """
+
+        offset = float(np.min(potential))
+        self.V = offset * np.eye(self.basis_size)
+        self.H = np.diag(self._kinetic_energies(0, self.basis_size)) + self.V
+        if self.adaptive: self.truncation_error = 0.0
+
+        energies = np.diagonal(self.H).copy()
+        nlowest = min(19, self.basis_size)
+        if self._emax is None: self._emax = energies[nlowest-1]
+        nkeep = np.searchsorted(energies, self._emax*1.2, side='right')
+        return energies[:nkeep], np.eye(self.basis_size)[:,:nkeep]
+
+    def _diagonalize(self, H):
+        """Returns the energies and coefficients (as columns) of the energy
+        eigenfunctions of `H` within the energy cutoff. Sets
+        :attr:`Particle._emax` if it was not given."""
+
+        nlowest = min(19, len(H))
+
+        # the basis functions with odd and even n are not coupled
+        if (self.parity_tolerance is not None and len(H) > 1
+            and np.abs(H[0::2,1::2]).max()
+                <= self.parity_tolerance * np.abs(H).max()):
+            return self._diagonalize_parity(H)
+
+        if self.solver == 'subset':
+            energies, coefficients = sp.linalg.eigh(H, driver='evr',
+                subset_by_value=[-np.inf, self._subset_cutoff(H)])
+        else:
+            energies, coefficients = np.linalg.eigh(H)
+
+        if self._emax is None: self._emax = energies[nlowest-1]
+        nkeep = np.searchsorted(energies, self._emax*1.2, side='right')
+        return energies[:nkeep], coefficients[:,:nkeep]
+
+    def _subset_cutoff(self, H):
+        """Returns the energy up to which ``solver='subset'`` asks LAPACK for
+        the energy eigenfunctions of `H`, so that a single reduction of `H`
+        is needed. If `emax` was not given, the 19th lowest energy is not
+        known yet, and an upper bound of it is used instead: the largest
+        energy of the hamiltonian within the first 19 basis functions (by
+        the minimax principle)."""
+
+        if self._emax is not None: return self._emax*1.2
+        nlowest = min(19, len(H))
+        bound = np.linalg.eigvalsh(H[:nlowest,:nlowest])[-1]
+        return max(bound, bound*1.2)
+
+    def _diagonalize_parity(self, H):
+        """Same as :py:func:`_diagonalize`, for a hamiltonian that does not
+        couple the basis functions with odd and even :math:`n` (i.e. with a
+        potential that is symmetric about :math:`L/2`). The two blocks of
+        half the size are diagonalized separately, which is about four times
+        cheaper, and their energy eigenfunctions are merged by energy."""
+
+        nlowest = min(19, len(H))
+        blocks = [H[0::2,0::2], H[1::2,1::2]]
+
+        if self.solver == 'subset':
+            cutoff = self._subset_cutoff(H)
+            solutions = [sp.linalg.eigh(block, driver='evr',
+                subset_by_value=[-np.inf, cutoff]) for block in blocks]
+        else:
+            solutions = [np.linalg.eigh(block) for block in blocks]
+
+        # put the eigenvectors of both blocks back in the full basis set
+        nodd = len(solutions[0][0])
+        energies = np.concatenate([solutions[0][0], solutions[1][0]])
+        coefficients = np.zeros((len(H), len(energies)))
+        coefficients[0::2,:nodd] = solutions[0][1]
+        coefficients[1::2,nodd:] = solutions[1][1]
+
+        order = np.argsort(energies, kind='stable')
+        energies, coefficients = energies[order], coefficients[:,order]
+        if self._emax is None: self._emax = energies[nlowest-1]
+        nkeep = np.searchsorted(energies, self._emax*1.2, side='right')
+        return energies[:nkeep], coefficients[:,:nkeep]
+
+    def _hamiltonian_operator(self, potential=None):
+        r"""Returns the hamiltonian in the basis set as a
+        :py:class:`scipy.sparse.linalg.LinearOperator`, without forming
+        the matrix.
+
+        The kinetic energy is diagonal. The potential energy is applied by
+        evaluating the wave function on the grid with a sine transform
+        (DST-I), multiplying by the quadrature weights and the potential,
+        and transforming back, in :math:`O(x_\text{points} \log
+        x_\text{points})` operations per vector.
+        """
+
+        if potential is None: potential = self.potential
+        nbasis = self.basis_size
+        npoints = self.xpoints - 2
+        if nbasis > npoints:
+            raise Exception('The sparse solver needs more grid points than '
+                            'basis functions!')
+
+        weighted = ( (self._quadrature_weights() * potential)[1:-1,None]
+                   / (2 * self.length) )
+        kinetic = self._kinetic_energies(0, nbasis)[:,None]
+
+        def matmat(b):
+            b = np.asarray(b).reshape(nbasis, -1)
+            padded = np.zeros((npoints, b.shape[1]), dtype=b.dtype)
+            padded[:nbasis] = b
+            psi = fft.dst(padded, type=1, axis=0)
+            Vb = fft.dst(psi * weighted, type=1, axis=0)[:nbasis]
+            return kinetic * b + Vb
+
+        return splinalg.LinearOperator((nbasis, nbasis), matvec=matmat,
+            matmat=matmat, dtype=float)
+
+    def _diagonalize_sparse(self, potential=None):
+        """Returns the energies and coefficients (as columns) of the energy
+        eigenfunctions within the energy cutoff, found with preconditioned
+        LOBPCG iterations on :py:func:`_hamiltonian_operator`. Sets
+        :attr:`Particle._emax` if it was not given.
+
+        The iterations start from the lowest particle-in-a-box states and
+        are preconditioned with the inverse kinetic energy, so only a few
+        tens of products with the hamiltonian are needed. The residuals are
+        converged to :attr:`Particle.tolerance` relative to the kinetic
+        energy of the highest state (the same tolerance as for an adaptive
+        basis set).
+        """
+
+        if potential is None: potential = self.potential
+        H = self._hamiltonian_operator(potential)
+        nbasis = self.basis_size
+        kinetic = self._kinetic_energies(0, nbasis)
+        shift = np.abs(potential).mean() + kinetic[0]
+
+        def precondition(b):
+            b = np.asarray(b)
+            return b / (kinetic + shift).reshape((-1,) + (1,)*(b.ndim-1))
+        M = splinalg.LinearOperator((nbasis, nbasis), matvec=precondition,
+            matmat=precondition, dtype=float)
+
+        # E_n >= T_n + min(V), so this many states cover the cutoff
+        def nstates_below(energy):
+            return np.searchsorted(kinetic + potential.min(), energy,
+                side='right') + 1
+
+        nlowest = min(19, nbasis)
+        nstates = nlowest
+        if self._emax is not None:
+            nstates = max(nlowest, nstates_below(self._emax*1.2))
+
+        # a fixed perturbation of the box states keeps LOBPCG from breaking
+        # down, and the solution reproducible
+        X = np.eye(nbasis)[:,:min(nstates, nbasis)]
+        X += 1e-3 * np.random.default_rng(0).standard_normal(X.shape)
+
+        while True:
+            # the states above the cutoff converge slowly, but are not kept
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                energies, coefficients = splinalg.lobpcg(H, X, M=M,
+                    largest=False, tol=self.tolerance*kinetic[X.shape[1]-1],
+                    maxiter=500)
+            order = np.argsort(energies)
+            energies, coefficients = energies[order], coefficients[:,order]
+            if self._emax is None: self._emax = energies[nlowest-1]
+
+            # add states until the cutoff is covered
+            nstates = min(nstates_below(self._emax*1.2), nbasis)
+            if nstates <= X.shape[1]: break
+            X = np.hstack((coefficients,
+                           np.eye(nbasis)[:,X.shape[1]:nstates]))
+
+        nkeep = np.searchsorted(energies, self._emax*1.2, side='right')
+        return energies[:nkeep], coefficients[:,:nkeep]
+
     def get_operator_matrices(self, C):
         r"""Calculates the operator matrices :math:`<\hat{x}>`,
         :math:`<\hat{x}^2>`, :math:`<\hat{p}>`, and :math:`<\hat{p}^2>`
         to get average and uncertainties in the position and
         momentum of our particle.
+
+        The matrices in the basis set only depend on the size of the
+        basis set and the length of the box, and are shared between
+        particles (see :py:func:`_basis_operator_matrices`), so only the
+        transformation to the energy eigenfunction basis is done here.
         """
 
-        # first, generate the <x> matrix in the basis set
-        xmat_basis = np.zeros((self.nmax, self.nmax))
-        for i in range(self.nmax):
-            n = i + 1
-            for j in range(i, self.nmax):
-                m = j + 1
-                if n == m:
-                    xmat_basis[i,i] = self.length / 2
-                else:
-                    if ((m-n)%2==1):
-                        xmat_basis[i,j] -= ( (2 * self.length / np.pi**2)
-                                           / ((m-n)**2) )
-                    if ((m+n)%2==1):
-                        xmat_basis[i,j] += ( (2 * self.length / np.pi**2)
-                                           / ((m+n)**2) )
-                    xmat_basis[j,i] = xmat_basis[i,j]
-
-        # now generate the <x> matrix in the energy eigenfunction basis
-        self._xmat = np.dot(C.T, np.dot(xmat_basis, C))
+        xmat_basis, x2mat_basis, pmat_basis, p2mat_basis = (
+            _basis_operator_matrices(len(C), self.length))
 
-        # create <x^2> matrix
-        x2mat_basis = np.zeros((self.nmax, self.nmax))
-        for i in range(self.nmax):
-            n = i + 1
-            for j in range(i, self.nmax):
-                m = j + 1
-                if n == m:
-                    x2mat_basis[i,i] = ( self.length**2 * ((2 * np.pi**2 * n**2)
-                        - 3 ) / (6 * np.pi**2 * n**2) )
-                else:
-                    x2mat_basis[i,j] += ( self.length**2 * ( 2 * np.pi * (m-n)
-                        * np.cos((m-n) * np.pi) ) / (np.pi**3 * (m-n)**3) )
-                    x2mat_basis[i,j] -= ( self.length**2 * ( 2 * np.pi * (m+n)
-                        * np.cos((m+n) * np.pi) ) / (np.pi**3 * (m+n)**3) )
-                x2mat_basis[j,i] = x2mat_basis[i,j]
+        # transform the matrices to the energy eigenfunction basis
+        self._xmat = np.dot(C.T, np.dot(xmat_basis, C))
         self._x2mat = np.dot(C.T, np.dot(x2mat_basis, C))
-
-        # create the <p> matrix
-        pmat_basis = np.zeros((self.nmax, self.nmax), dtype=complex)
-        for i in range(self.nmax):
-            n = i + 1
-            for j in range(i+1, self.nmax):
-                m = j + 1
-                if (m+n)%2 == 1:
-                    pmat_basis[i,j] = 4j * m * n / (self.length
-                        * (m**2 - n**2))
-                    pmat_basis[j,i] = -pmat_basis[i,j]
         self._pmat = np.dot(C.T, np.dot(pmat_basis, C))
-
-        # create the <p^2> matrix
-        p2mat_basis = np.zeros((self.nmax, self.nmax), dtype=complex)
-        for i in range(self.nmax):
-            n = i + 1
-            p2mat_basis[i,i] = n**2 * np.pi**2 / self.length**2
         self._p2mat = np.dot(C.T, np.dot(p2mat_basis, C))
 
 
@@ -326,13 +1181,74 @@ class Particle():
         psi = np.einsum('i,ij->j', self.Ct, self.wave_functions)
         return psi
 
+    def get_space_time(self, times, C=None, probability=False,
+        single_precision=False, chunk_size=None):
+        r"""Returns the wave function (or probability density) in position
+        basis at many times at once, e.g. to draw a "quantum carpet".
+
+        :param numpy.ndarray times: Times at which to evaluate the wave
+            function.
 
-    def position_momentum_collapse(self, psi, x0=None, k0=None, momentum=False):
+        :param numpy.ndarray C: Coefficients of the wave function in
+            eigenfunctions basis at time zero. Default `None`
+            (:attr:`Particle.C`).
+
+        :param bool probability: Whether to return the probability density
+            :math:`|\Psi(x,t)|^2` instead of :math:`\Psi(x,t)`.
+            Default `False`.
+
+        :param bool single_precision: Whether to calculate and return
+            single precision (float32/complex64) values. Default `False`.
+
+        :param int chunk_size: Maximum number of times evaluated together,
+            to limit the memory used. Default `None` (all times at once).
+
+        :return: The wave function (or probability density), one row per
+            time and one column per point in :attr:`Particle.x`.
+        :type: numpy.ndarray
+
+        """
+
+        if C is None: C = self.C
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        ntimes = len(times)
+        if chunk_size is None: chunk_size = ntimes
+        chunk_size = max(1, chunk_size)
+
+        if single_precision:
+            complex_type, real_type = np.complex64, np.float32
+        else:
+            complex_type, real_type = complex, float
+        wave_functions = self.wave_functions.astype(complex_type)
+        result = np.empty((ntimes, self.xpoints),
+            dtype=real_type if probability else complex_type)
+
+        for start in range(0, ntimes, chunk_size):
+            stop = min(start + chunk_size, ntimes)
+
+            # coefficients at each time, then one product for all times
+            Ct = C * np.exp(-1j * np.outer(times[start:stop], self.energies))
+            psi = np.dot(Ct.astype(complex_type), wave_functions)
+
+            if probability:
+                result[start:stop] = psi.real**2 + psi.imag**2
+            else:
+                result[start:stop] = psi
+
+        return result
+
+
+    def position_momentum_collapse(self, psi, x0=None, k0=None, momentum=False,
+        Ct=None):
         r"""Collapse the wave function to a particle with a position/momentum
         with minimum uncertainty: :math:`\Delta_x \times \Delta_p = 1/2`
         For a position collapse: :math:`\Delta_x = L / 200`
         For a momentum collapse: :math:`\Delta_p = 5 / L`
 
+        If the coefficients `Ct` of `psi` are given, the momentum
+        distribution is calculated from :attr:`Particle.momentum_overlaps`
+        instead of transforming `psi` on the grid.
+
         :returns: Tuple of the new wave function coefficients, the 
             collapsed position :math:`x_0` and the collaposed momentum
             :math:`p_0`.
@@ -353,17 +1269,16 @@ class Particle():
             probabilities /= total_probabilities
 
             # find new collapse position
-            x0 = self.x[np.random.choice(self.xpoints, p=probabilities)]
+            x0 = self.x[self.rng.choice(self.xpoints, p=probabilities)]
 
         # find the collapsed momentum (even for a collapsed position)
         # transform wave function from position to momentum basis
         if k0 is None:
             momenta = self.momenta
-            psi_p = np.zeros((len(momenta)), dtype=complex)
-            for ip in range(len(momenta)):
-                psi_p[ip] = ( 1/np.sqrt(2*np.pi)
-                    * sp.integrate.simps(psi * np.exp(1j * momenta[ip] * self.x),
-                    self.x) )
+            if Ct is not None:
+                psi_p = np.dot(self.momentum_overlaps, Ct)
+            else:
+                psi_p = np.dot(self._get_plane_waves(), psi)
 
             # normalize momentum distribution
             prob = (psi_p*psi_p.conjugate()).real
@@ -371,7 +1286,7 @@ class Particle():
             prob /= total_prob
 
             # collapse to a single momentum
-            p_ix = np.random.choice(len(momenta), p=prob)
+            p_ix = self.rng.choice(len(momenta), p=prob)
             k0 = momenta[p_ix]
 
         # find gaussian wave function
@@ -380,8 +1295,7 @@ class Particle():
             * np.exp(1j * k0 * self.x) )
 
         # find superposition of position wave function
-        solution = sp.linalg.lstsq(self.wave_functions.T, y0) 
-        C_new = solution[0]
+        C_new = np.dot(self._get_projector(), y0)
 
         # normalize the coefficients
         temp = (C_new.conjugate() * C_new).real.sum()
@@ -399,7 +1313,8 @@ class Particle():
         """
     
         probabilities = (self.C*self.C.conjugate()).real
-        n = np.random.choice(len(self.energies), p=probabilities) + n_change
+        probabilities /= probabilities.sum()
+        n = self.rng.choice(len(self.energies), p=probabilities) + n_change
         if n < 0: n = 0
         if n > self.nmax - 1: n = self.nmax - 1
         e0 = self.energies[n]
@@ -408,3 +1323,144 @@ class Particle():
 
         return C_new, e0
 
+    def sample_measurements(self, kind, n, C=None, goal=None, bins=50):
+        """Simulates `n` measurements of the position, momentum or energy of
+        the same wave function at once, e.g. to show the statistics of many
+        collapses.
+
+        :param str kind: What is measured, ``'position'``, ``'momentum'`` or
+            ``'energy'``.
+
+        :param int n: Number of measurements.
+
+        :param numpy.ndarray C: Coefficients of the wave function in
+            eigenfunctions basis. Default `None` (:attr:`Particle.Ct`, or
+            :attr:`Particle.C` before the wave function has been evolved).
+
+        :param tuple goal: Lower and upper bound of the measurements that
+            count as a success. Default `None`.
+
+        :param int bins: Number of bins of the position histogram.
+            Default 50.
+
+        :returns: Tuple of the measured values, the histogram and the
+            fraction of measurements within `goal` (None if no `goal` is
+            given). The histogram is a tuple of the counts and the bin edges
+            for positions (see :py:func:`numpy.histogram`), and of the counts
+            and the possible outcomes (:attr:`Particle.momenta` or
+            :attr:`Particle.energies`) otherwise.
+
+        """
+
+        if C is None: C = getattr(self, 'Ct', self.C)
+
+        if kind == 'position':
+            psi = np.dot(C, self.wave_functions)
+            outcomes = self.x
+            probabilities = (psi*psi.conjugate()).real
+        elif kind == 'momentum':
+            outcomes, probabilities = self.momentum_distribution(C)
+        elif kind == 'energy':
+            outcomes = self.energies
+            probabilities = (C*C.conjugate()).real
+        else:
+            raise Exception('Unknown measurement "{0}"!'.format(kind))
+
+        # draw all outcomes from the cumulative distribution at once
+        cumulative = np.cumsum(probabilities)
+        cumulative /= cumulative[-1]
+        indices = np.searchsorted(cumulative, self.rng.random(n), side='right')
+        indices = np.minimum(indices, len(outcomes) - 1)
+        samples = outcomes[indices]
+
+        if kind == 'position':
+            histogram = np.histogram(samples, bins=bins,
+                range=(0, self.length))
+        else:
+            histogram = (np.bincount(indices, minlength=len(outcomes)),
+                outcomes)
+
+        success_rate = None
+        if goal is not None:
+            success_rate = np.count_nonzero((goal[0] <= samples)
+                & (samples <= goal[1])) / n
+
+        return samples, histogram, success_rate
+
+
+class PotentialMatrix():
+    r"""Potential energy matrix of a potential that is edited a few grid
+    points at a time (e.g. drawn in the sandbox).
+
+    Edits only mark their range of grid points as changed. When the matrix
+    is needed, only the changed points are integrated against the basis
+    set, as the matrix is linear in the values of the potential:
+
+    .. math::
+
+        \mathbf{V}_{nm} \leftarrow \mathbf{V}_{nm} + \sum_{k \in
+        \text{changed}} \chi_n(x_k) w_k \Delta V(x_k) \chi_m(x_k)
+
+    so the cost of an update depends on the size of the edit rather than
+    the size of the grid.
+
+    :param particle: The particle that defines the grid, basis set and
+        quadrature weights (see :py:func:`Particle._quadrature_weights`)
+    :type particle: qpias.particle.Particle
+
+    :param potential: The potential to start from, default None
+        (:attr:`Particle.potential`)
+    :type potential: numpy.ndarray, optional
+
+    :var numpy.ndarray potential: The current potential.
+
+    **Example**::
+
+        >>> V = qpias.particle.PotentialMatrix(particle)
+        >>> V.update(np.full((10), 500.0), start=200)
+        >>> H = np.diag(T) + V.matrix
+    """
+
+    def __init__(self, particle, potential=None):
+        """Initializes the :py:class:`PotentialMatrix` class."""
+
+        if potential is None: potential = particle.potential
+        self.potential = np.array(potential, dtype=float)
+        self._basis = _sine_basis(particle.basis_size, particle.length,
+            particle.xpoints)
+        self._weights = particle._quadrature_weights()
+        self._integrated = self.potential.copy()
+        self._matrix = particle._potential_matrix_columns(self.potential, 0,
+            particle.basis_size)
+        self._dirty = []
+
+    def update(self, values, start=0):
+        """Sets the potential from grid point `start` onwards to `values`."""
+
+        stop = start + len(values)
+        self.potential[start:stop] = values
+        self._dirty.append((start, stop))
+
+    @property
+    def matrix(self):
+        """The potential energy matrix of the current potential."""
+
+        # merge the overlapping ranges, then integrate the changes
+        for start, stop in self._merged_ranges():
+            delta = self.potential[start:stop] - self._integrated[start:stop]
+            if not delta.any(): continue
+            basis = self._basis[:,start:stop]
+            self._matrix += np.dot(basis * (self._weights[start:stop]
+                * delta), basis.T)
+            self._integrated[start:stop] = self.potential[start:stop]
+        self._dirty = []
+        return self._matrix
+
+    def _merged_ranges(self):
+        ranges = []
+        for start, stop in sorted(self._dirty):
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], stop)
+            else:
+                ranges.append([start, stop])
+        return ranges
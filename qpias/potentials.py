@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+# model potentials
+def harmonic_oscillator_potential():
+    return ((np.linspace(0,1,500)-0.5))**2 * 40000.0
+
+def morse_potential(re=0.12, de=2000):
+    x = np.linspace(0,1,500)
+    return de * (1 - np.exp(-8 * (x - re)))**2
+
+def barrier_potential(x0=0.46, x1=0.56, de=1200):
+    x = np.linspace(0,1,500)
+    potential = np.zeros_like(x)
+    potential[np.where((x>=x0)&(x<=x1))] = de
+    return potential
+
+def coulombic_potential():
+    potential = -1/np.abs(np.linspace(0,1,100)-0.5001)
+    potential += 1000
+    return potential
+
+
+# potentials used in the concepts levels
+def schrodinger_cat_potential():
+    potential = np.zeros((1001))
+    potential[400:601] = 50000
+    return potential
+
+def uncertainty_potential():
+    potential = np.zeros((1001)) + 500
+    potential[200:301] = 600
+    potential[600:701] = 0
+    return potential
+
+def tunneling_potential(height=800):
+    potential = np.zeros((501))
+    potential[230:281] = height
+    return potential
+
+def momentum_tutorial_potential():
+    return np.abs(0.5 - np.linspace(0,1,1001)) * 5000
+
+def stairs_potential():
+    potential = np.zeros((1001))
+    potential[200:400] = 1000
+    potential[400:600] = 2000
+    potential[600:800] = 3000
+    potential[800:]    = 4000
+    return potential
+
+def well_potential():
+    potential = np.zeros((1001)) + 4000
+    potential[450:551] = 0
+    return potential
+
+def cliff_potential():
+    potential = np.zeros((1001))
+    potential[:200] = 5000
+    return potential
+
+
+def builtin_stages():
+    """Returns the potential, box length and maximum energy of every stage
+    that comes with the game (the model potentials and the concepts
+    levels), as a list of ``(potential, length, emax)`` tuples. The
+    particle-in-a-box stages (including the box length levels) are left
+    out, since constant potentials are solved analytically."""
+
+    stages = [(harmonic_oscillator_potential(), 1, None),
+              (morse_potential(), 1, None),
+              (coulombic_potential(), 1, None),
+              (barrier_potential(), 1, None),
+              (schrodinger_cat_potential(), 1, None),
+              (uncertainty_potential(), 1, None),
+              (tunneling_potential(800), 1, None),
+              (tunneling_potential(1800), 1, None),
+              (momentum_tutorial_potential(), 1, None),
+              (stairs_potential(), 1, None),
+              (well_potential(), 1, None),
+              (cliff_potential(), 1, None)]
+
+    return stages
@@ -1,12 +1,175 @@
+import threading
+import time
+import warnings
+
 import pygame
 from pygame.locals import QUIT, VIDEORESIZE, KEYDOWN, MOUSEBUTTONUP
 from pygame.locals import MOUSEMOTION
 import numpy as np
 import scipy as sp
 from scipy import interpolate
+from scipy.sparse import linalg as splinalg
 
+from qpias.particle import Particle, PotentialMatrix
 from qpias.stage import Stage
 
+
+class PotentialPreview():
+    """Solves the hamiltonian of a potential while it is being drawn, in a
+    background thread, so that the lowest energy levels and the ground
+    state can be shown without slowing down the drawing loop.
+
+    The newest potential given to :py:func:`submit` is solved at most once
+    every `interval` seconds (older ones are skipped). Only the edited
+    points are integrated into the potential energy matrix (see
+    :py:class:`qpias.particle.PotentialMatrix`), and each solve is a few
+    LOBPCG iterations started from the eigenvectors of the previous solve,
+    which barely change between two strokes of the pen.
+
+    :param xpoints: Number of points of the drawn potential (from 0 to 1)
+    :type xpoints: int
+
+    :param scale: Factor between the drawn potential and the potential
+        energy, default 10000
+    :type scale: float, optional
+
+    :param nstates: Number of energy levels to show, default 5
+    :type nstates: int, optional
+
+    :param nmax: Size of the basis set, default 40
+    :type nmax: int, optional
+
+    :param interval: Minimum time between two solves in seconds, default 0.2
+    :type interval: float, optional
+
+    :var numpy.ndarray energies: The energies of the last solve (or None).
+
+    :var numpy.ndarray ground_state: The ground state of the last solve on
+        the grid of the drawn potential (or None).
+
+    :var int version: Number of finished solves.
+    """
+
+    def __init__(self, xpoints, scale=10000, nstates=5, nmax=40,
+        interval=0.2):
+        """Initializes the :py:class:`PotentialPreview` class."""
+
+        self.scale = scale
+        self.nstates = nstates
+        self.interval = interval
+
+        self._particle = Particle(nmax=nmax, potential=np.zeros((xpoints)))
+        self._particle.generate_basis_functions()
+        self._kinetic = self._particle._kinetic_energies(0, nmax)
+        self._matrix = PotentialMatrix(self._particle)
+        self._vectors = None
+
+        self.energies = None
+        self.ground_state = None
+        self.version = 0
+
+        self._potential = None
+        self._edits = []
+        self._running = True
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def submit(self, potential, edits=None):
+        """Asks for the drawn `potential` to be solved.
+
+        :param edits: The ``(start, stop)`` ranges of grid points changed
+            since the last call, default None (all points)
+        :type edits: list, optional
+        """
+        if edits is None: edits = [(0, len(potential))]
+        with self._condition:
+            self._potential = np.array(potential, dtype=float)
+            self._edits.extend(edits)
+            self._condition.notify()
+
+    def stop(self):
+        """Stops the background thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while self._running and self._potential is None:
+                    self._condition.wait()
+                if not self._running: return
+                potential = self._potential
+                edits = self._edits
+                self._potential = None
+                self._edits = []
+
+            start = time.monotonic()
+            self._solve(potential, edits)
+            time.sleep(max(0, self.interval - (time.monotonic() - start)))
+
+    def _solve(self, potential, edits):
+        particle = self._particle
+        nmax = len(self._kinetic)
+        potential = potential * self.scale
+        for start, stop in edits:
+            self._matrix.update(potential[start:stop], start)
+        H = np.diag(self._kinetic) + self._matrix.matrix
+
+        # start from the previous solution, or from the box states
+        if self._vectors is None:
+            X = np.eye(nmax)[:,:self.nstates]
+            X += 1e-3 * np.random.default_rng(0).standard_normal(X.shape)
+        else:
+            X = self._vectors
+
+        diagonal = self._kinetic + np.abs(potential).mean()
+        M = splinalg.LinearOperator((nmax, nmax), dtype=float,
+            matvec=lambda b: b / diagonal.reshape((-1,) + (1,)*(b.ndim-1)),
+            matmat=lambda b: b / diagonal[:,None])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            energies, vectors = splinalg.lobpcg(H, X, M=M, largest=False,
+                tol=1e-6 * self._kinetic[self.nstates], maxiter=40)
+        order = np.argsort(energies)
+        self._vectors = vectors[:,order]
+
+        self.ground_state = np.dot(self._vectors[:,0], particle.basis)
+        self.energies = energies[order]
+        self.version += 1
+
+
+def draw_potential_preview(game, x, potential, preview, pen):
+    """Redraws the drawn potential with the energy levels and ground state
+    of the last solve of `preview`."""
+
+    height = game.height
+    game.screen.fill((255,255,255))
+
+    for i in range(len(potential)):
+        pygame.draw.line(game.screen, (0,0,0),
+            (int(x[i]*game.width), int(height - potential[i]*height)),
+            (int(x[i]*game.width), game.height), pen)
+
+    if preview.energies is None: return
+
+    # energy levels, on the same scale as the potential
+    levels = height - preview.energies / preview.scale * height
+    for level in levels:
+        if 0 <= level <= height:
+            pygame.draw.line(game.screen, (44,160,44), (0, int(level)),
+                (game.width, int(level)), 2)
+
+    # ground state on top of its energy level
+    psi = preview.ground_state
+    psi = psi * np.sign(psi[np.argmax(np.abs(psi))])
+    psi = levels[0] - psi / np.abs(psi).max() * height * 0.1
+    points = [(int(xi*game.width), int(yi)) for xi, yi in zip(x, psi)]
+    pygame.draw.lines(game.screen, (31,119,180), False, points, 3)
+
+
 def sandbox_information(game):
 
     welcome_text = ("Welcome to the Sandbox. Here you can draw any "
@@ -14,8 +177,10 @@ def sandbox_information(game):
                     "wave function evolves in this potential.")
 
     sandbox_help = ("On the next screen, [CLICK] and move your mouse "
-                    "to draw a 1-dimensional potential. Press [ENTER] after "
-                    "you've drawn your potential to see the wave function.")
+                    "to draw a 1-dimensional potential. The lowest energy "
+                    "levels and the ground state are shown as you draw. "
+                    "Press [ENTER] after you've drawn your potential to see "
+                    "the wave function.")
 
     keys_text = ("Keys:\n"
                  "[Esc] - Return to the Main Menu.\n"
@@ -75,6 +240,11 @@ def sandbox_potential(game):
     x = np.linspace(0,1,game.width+1)
     pen = int(game.width / 50.)
 
+    # solves the potential in the background while it is being drawn
+    preview = PotentialPreview(len(x))
+    preview_version = 0
+    edits = []
+
     in_sandbox_potential = True
     while in_sandbox_potential:
 
@@ -98,6 +268,11 @@ def sandbox_potential(game):
                 potential = func(x_new)
                 x = x_new
 
+                preview.stop()
+                preview = PotentialPreview(len(x))
+                preview_version = 0
+                edits = [(0, len(x))]
+
                 for i in range(len(potential)):
                     pygame.draw.line(game.screen, (0,0,0),
                         (int(x[i]*game.width), int(height - potential[i]*height)),
@@ -108,6 +283,7 @@ def sandbox_potential(game):
 
                 if event.key == pygame.K_ESCAPE:
                     in_sandbox_potential = False
+                    preview.stop()
 
                 # ENTER key saves the potential and calculates the wave function
                 if event.key == pygame.K_RETURN:
@@ -120,20 +296,36 @@ def sandbox_potential(game):
 
                     # reset some things when you return to this screen
                     game.screen.fill((255,255,255))
+                    preview.stop()
+                    preview = PotentialPreview(len(x))
+                    preview_version = 0
+                    edits = []
 
             # check for mouse motion
             if event.type == MOUSEMOTION:
                 if event.buttons[0]: # left mouse button:
 
-                    potential[np.where((x>=(event.pos[0]-pen/2)/game.width)&
-                        (x<=(event.pos[0]+pen/2)/game.width))] = (
-                        (height - event.pos[1]) / height)
+                    changed = np.where((x>=(event.pos[0]-pen/2)/game.width)&
+                        (x<=(event.pos[0]+pen/2)/game.width))[0]
+                    potential[changed] = (height - event.pos[1]) / height
+                    if len(changed) > 0:
+                        edits.append((changed[0], changed[-1]+1))
 
                     pygame.draw.line(game.screen, (0,0,0),
                         event.pos, (event.pos[0],game.height), pen)
                     pygame.draw.line(game.screen, (255,255,255),
                         (event.pos[0],0), event.pos, pen)
 
+        # solve the new potential in the background
+        if edits:
+            preview.submit(potential, edits)
+            edits = []
+
+        # show the newest energy levels and ground state
+        if preview.version != preview_version:
+            preview_version = preview.version
+            draw_potential_preview(game, x, potential, preview, pen)
+
         game.blit_texts(text, color=(200,0,0))
 
         # update and tick clock
@@ -3,12 +3,15 @@ from pygame.locals import QUIT, KEYDOWN, MOUSEBUTTONUP, VIDEORESIZE
 import numpy as np
 
 from qpias.particle import Particle
+from qpias.cache import get_default_cache
+from qpias.dynamics import (EigenPropagator, MidpointPropagator,
+    SplitOperatorPropagator)
 
 class Stage():
 
     def __init__(self, game, potential, initial_conditions=None,
         goal=None, level_options=None, events=None, superposition_mode=False,
-        eigenvectors_mode=False):
+        eigenvectors_mode=False, driving=None, dynamics='eigen'):
 
         self.game = game
         self.game._level_reset()
@@ -26,6 +29,16 @@ class Stage():
 
         self.events = events
 
+        # function of time that returns a time-dependent potential
+        self.driving = driving
+
+        # how to propagate the wave function of a static potential, either
+        # in the energy eigenfunctions ('eigen') or on the grid
+        # ('split-operator', for large grids and fast wave packets)
+        if dynamics not in ('eigen', 'split-operator'):
+            raise Exception('Unknown dynamics "{0}"!'.format(dynamics))
+        self.dynamics = dynamics
+
         if initial_conditions is not None:
             if 'length' in initial_conditions:
                 length = initial_conditions['length']
@@ -39,8 +52,10 @@ class Stage():
             length = 1
             emax = None
 
-        # generate the particle
-        particle = Particle(potential=potential, length=length, emax=emax)
+        # generate the particle (reusing the solution from a previous visit
+        # if available)
+        particle = Particle(potential=potential, length=length, emax=emax,
+                            cache=get_default_cache())
         particle.calculate_wave_functions()
 
         # set initial conditions if given 
@@ -74,24 +89,41 @@ class Stage():
                            'G': 0,
                            'S': 0,
                            'E': 0,
+                           'C': 0,
                            'EVENT': 0,
                            'TIME': 0}
         self.last_occurance = self.occurances.copy()
         last_time = pygame.time.get_ticks()
 
+        # propagates the wave function from one frame to the next
+        if self.driving is not None:
+            self.propagator = MidpointPropagator(particle, self.driving,
+                particle.C)
+        elif self.dynamics == 'split-operator':
+            self.propagator = SplitOperatorPropagator(particle, particle.C)
+        else:
+            self.propagator = EigenPropagator(particle, particle.C)
+
+        # the coefficients of a wave function propagated on the grid are only
+        # its projection, so the momentum collapses transform it instead
+        projected = isinstance(self.propagator, SplitOperatorPropagator)
+
         self.running = True
         while self.running:
 
             # fill screen with white 
             game.screen.fill((255,255,255))
 
-            # advance game and particle times 
+            # advance game and particle times and get the wave function
             game.time += game.dt
-            particle.time = game.time
+            psi = self.propagator.step(game.dt)
 
-            # get and plot the wave function
-            psi = particle.get_wave_function(particle.C, game.time)
-            game.plot_wave_function(particle, psi)
+            # plot the wave function
+            if self.driving is None:
+                game.plot_wave_function(particle, psi)
+            else:
+                game.plot_wave_function(particle, psi,
+                    self.propagator.energy(), self.propagator.potential)
             game.draw_bottom_bar()
    
             # set null selection and ellapsed time
@@ -114,11 +146,14 @@ class Stage():
     
                     # if the x key is pressed - position collapse
                     if selection == 'X':
+                        self._restart_clock(particle)
                         C_new, x0, k0 = particle.position_momentum_collapse(
-                                            psi, momentum=False)
+                                            psi, momentum=False,
+                                            Ct=None if projected else particle.Ct)
                         game.collapse_animation(particle, particle.C, C_new)
                         particle.C = C_new
                         game.time = 0
+                        self.propagator.reset(C_new)
 
                         # check whether goal is achieved
                         if self.goal is not None and 'position' in self.goal:
@@ -128,11 +163,14 @@ class Stage():
 
                     # if the P key is pressed - momentum collapse            
                     elif selection == 'P':
+                        self._restart_clock(particle)
                         C_new, x0, k0 = particle.position_momentum_collapse(
-                                            psi, momentum=True)
+                                            psi, momentum=True,
+                                            Ct=None if projected else particle.Ct)
                         game.collapse_animation(particle, particle.C, C_new)
                         particle.C = C_new
                         game.time = 0
+                        self.propagator.reset(C_new)
 
                         # check whether goal is achieved
                         if self.goal is not None and 'position' in self.goal:
@@ -142,11 +180,13 @@ class Stage():
 
                     # if the G key is pressed - return to the ground state
                     elif selection == 'G':
+                        self._restart_clock(particle)
                         C_new = np.zeros((particle.nmax))
                         C_new[0] = 1
                         game.collapse_animation(particle, particle.C, C_new)
                         particle.C = C_new
                         game.time = 0
+                        self.propagator.reset(C_new)
 
                         # check whether goal is achieved
                         e0 = particle.energies[0]
@@ -164,10 +204,12 @@ class Stage():
     
                     # if the UP key is pressed - increased energy quantum
                     elif selection == 'UP':
+                        self._restart_clock(particle)
                         C_new, e0 = particle.energy_collapse(n_change=1)
                         game.collapse_animation(particle, particle.C, C_new)
                         particle.C = C_new
                         game.time = 0
+                        self.propagator.reset(C_new)
 
                         # check whether goal is achieved
                         if self.goal is not None and 'energy' in self.goal:
@@ -176,10 +218,12 @@ class Stage():
 
                     # if the DOWN key is pressed - decrease energy quantum
                     elif selection == 'DOWN':
+                        self._restart_clock(particle)
                         C_new, e0 = particle.energy_collapse(n_change=-1)
                         game.collapse_animation(particle, particle.C, C_new)
                         particle.C = C_new
                         game.time = 0
+                        self.propagator.reset(C_new)
     
                         # check whether goal is achieved
                         if self.goal is not None and 'energy' in self.goal:
@@ -197,6 +241,7 @@ class Stage():
                         else:
                             game.superposition_mode = True
                             game.eigenvectors_mode = False
+                            game.carpet_mode = False
 
                     # if the E key is pressed - change to/from eigenvectors mode
                     elif selection == 'E':
@@ -205,6 +250,16 @@ class Stage():
                         else:
                             game.eigenvectors_mode = True
                             game.superposition_mode = False
+                            game.carpet_mode = False
+
+                    # if the C key is pressed - change to/from space-time mode
+                    elif selection == 'C':
+                        if game.carpet_mode:
+                            game.carpet_mode = False
+                        else:
+                            game.carpet_mode = True
+                            game.superposition_mode = False
+                            game.eigenvectors_mode = False
 
                     # count occurances of a key
                     if selection is not None:
@@ -235,6 +290,15 @@ class Stage():
         return self._completed
 
 
+    def _restart_clock(self, particle):
+        # collapses start from the current coefficients of the propagator
+        # (not the coefficients at time zero, which are only phase-shifted
+        # with the energy eigenfunctions and go stale when the potential is
+        # driven or the wave function is propagated on the grid)
+        particle.C = np.copy(self.propagator.Ct)
+        self.game.time = 0
+
+
     def check_event(self, selection):
 
         for event in self.events:
@@ -262,6 +326,7 @@ class Stage():
                 'G': pygame.K_g,
                 'S': pygame.K_s,
                 'E': pygame.K_e,
+                'C': pygame.K_c,
                 'LEFT': pygame.K_LEFT,
                 'RIGHT': pygame.K_RIGHT,
                 'UP': pygame.K_UP,
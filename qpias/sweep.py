@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import itertools
+import os
+
+import numpy as np
+
+from qpias.particle import (solve_batch, _simpson_weights, _sine_basis,
+    _basis_operator_matrices)
+
+
+def run_sweep(factory, grid, nstates=10, x_split=None, nmax=40, length=1,
+    mass=1, potential_method='quadrature', workers=None, chunksize=None):
+    """Solves a family of potentials over a grid of parameters in parallel
+    and returns observables of the lowest energy eigenfunctions.
+
+    Every combination of the parameters in `grid` is passed to `factory` to
+    create a potential. The potentials are solved in chunks (see
+    :py:func:`qpias.particle.solve_batch`) by a pool of worker processes,
+    each of which keeps its own read-only copy of the basis functions and
+    operator matrices.
+
+    :param factory: Function that takes the parameters as keyword arguments
+        and returns a potential. It must be importable by the worker
+        processes (e.g. :py:func:`qpias.potentials.barrier_potential`).
+    :type factory: callable
+
+    :param grid: Values of each parameter, e.g.
+        ``{'de': [800, 1200], 'x1': [0.5, 0.56]}``
+    :type grid: dict
+
+    :param nstates: Number of (lowest) energy eigenfunctions to analyze,
+        default 10
+    :type nstates: int, optional
+
+    :param x_split: Position past which to calculate the tunneling
+        probability of each state, default None (not calculated)
+    :type x_split: float, optional
+
+    :param nmax: Size of the basis set, default 40
+    :type nmax: int, optional
+
+    :param length: Length of the box, default 1
+    :type length: float, optional
+
+    :param mass: Mass of the particle, default 1
+    :type mass: float, optional
+
+    :param potential_method: How to evaluate the potential energy matrices,
+        default ``'quadrature'``. See :py:class:`qpias.particle.Particle`.
+    :type potential_method: str, optional
+
+    :param workers: Number of worker processes, default None (one per CPU).
+        Use 1 to solve everything in the current process.
+    :type workers: int, optional
+
+    :param chunksize: Number of potentials solved together by a worker,
+        default None (about four chunks per worker)
+    :type chunksize: int, optional
+
+    :returns: Structured array with one row per combination of parameters,
+        with a field for each parameter, and the fields ``'energies'``,
+        ``'x_mean'`` (:math:`<x>`), ``'x_uncertainty'`` (:math:`\\Delta x`)
+        and, if `x_split` is given, ``'tunneling'``, each holding one value
+        per state.
+    :type: numpy.ndarray
+
+    **Example**::
+
+        >>> table = qpias.sweep.run_sweep(qpias.potentials.barrier_potential,
+        ...     {'de': np.linspace(0, 3000, 100)}, x_split=0.56)
+        >>> table['de'], table['tunneling'][:,0]
+    """
+
+    names = list(grid)
+    parameters = [dict(zip(names, values)) for values
+                  in itertools.product(*[grid[name] for name in names])]
+
+    # the grid size is needed to set up the workers
+    xpoints = len(factory(**parameters[0]))
+    options = {'nstates': nstates, 'x_split': x_split, 'nmax': nmax,
+               'length': length, 'mass': mass,
+               'potential_method': potential_method}
+
+    if workers is None: workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, -(-len(parameters) // (4 * workers)))
+    chunks = [parameters[i:i+chunksize] for i
+              in range(0, len(parameters), chunksize)]
+
+    if workers == 1:
+        results = [_solve_chunk(factory, chunk, options) for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+            initializer=_initialize_worker,
+            initargs=(nmax, length, xpoints)) as executor:
+            results = list(executor.map(_solve_chunk,
+                itertools.repeat(factory), chunks, itertools.repeat(options)))
+
+    # collect the results in a single table
+    nstates = results[0]['energies'].shape[1]
+    dtype = [(name, float) for name in names]
+    dtype += [(name, float, (nstates,)) for name in results[0]]
+    table = np.zeros((len(parameters)), dtype=dtype)
+    for name in names:
+        table[name] = [p[name] for p in parameters]
+    for name in results[0]:
+        table[name] = np.concatenate([result[name] for result in results])
+    return table
+
+
+def _initialize_worker(nmax, length, xpoints):
+    """Builds the basis functions and operator matrices once per worker
+    process, so that all chunks solved by the worker share them."""
+    _sine_basis(nmax, length, xpoints)
+    _basis_operator_matrices(nmax, length)
+
+
+def _solve_chunk(factory, parameters, options):
+    """Solves the potentials of one chunk of parameters and returns their
+    observables as a dictionary of (potentials x states) arrays."""
+
+    potentials = np.array([factory(**p) for p in parameters], dtype=float)
+    nmax = options['nmax']
+    length = options['length']
+
+    energies, coefficients, matrices = solve_batch(potentials, nmax=nmax,
+        length=length, mass=options['mass'],
+        potential_method=options['potential_method'],
+        nstates=options['nstates'], operators=True)
+
+    x_mean = np.diagonal(matrices['x'], axis1=1, axis2=2)
+    x2_mean = np.diagonal(matrices['x2'], axis1=1, axis2=2)
+    observables = {'energies': energies,
+                   'x_mean': x_mean,
+                   'x_uncertainty': np.sqrt(np.abs(x2_mean - x_mean**2))}
+
+    # probability of finding each state past x_split
+    if options['x_split'] is not None:
+        xpoints = potentials.shape[1]
+        x = np.linspace(0, length, xpoints)
+        weights = _simpson_weights(x) * (x >= options['x_split'])
+        wave_functions = np.matmul(np.swapaxes(coefficients, 1, 2),
+            _sine_basis(nmax, length, xpoints))
+        observables['tunneling'] = np.dot(wave_functions**2, weights)
+
+    return observables
@@ -14,6 +14,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/dchulhai/QPiaS",
     packages=setuptools.find_packages(),
+    package_data={'qpias': ['data/*.npz']},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",